@@ -0,0 +1,422 @@
+"""Двухуровневый кеш для нескольких процессов сервера.
+
+L1 — небольшой кеш в памяти процесса, L2 — общий для всех процессов
+машины кеш в файле SQLite. Запись идёт в L2 и журнал сбросов L2, затем
+в L1. Каждый процесс не реже раза в SYNC_INTERVAL секунд читает новые
+записи журнала и удаляет перечисленные ключи из своего L1, поэтому
+запись в одном процессе доходит до остальных.
+"""
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.functional import cached_property
+
+SQLITE_MAX_VARIABLES = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS cache_expires_idx ON cache (expires);
+CREATE TABLE IF NOT EXISTS invalidation (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keys TEXT
+);
+'''
+
+
+def chunks(items, size=SQLITE_MAX_VARIABLES):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite, общий для процессов одной машины.
+
+    Целые числа хранятся как INTEGER, поэтому incr атомарен между
+    процессами. Таблица invalidation — журнал сбросов для TieredCache.
+    """
+    BUSY_TIMEOUT = 5
+    CULL_EVERY = 100
+    LOG_SIZE = 10000
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._writes = 0
+
+    @cached_property
+    def _db(self):
+        db = sqlite3.connect(
+            self._path, timeout=self.BUSY_TIMEOUT, isolation_level=None
+        )
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(SCHEMA)
+        return db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _write(self, sql, key, value, timeout):
+        cursor = self._db.execute(
+            sql, (key, self._dump(value), self.get_backend_timeout(timeout))
+        )
+        self._writes += 1
+        if self._writes % self.CULL_EVERY == 0:
+            self._cull()
+        return cursor.rowcount
+
+    def _cull(self):
+        db = self._db
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        return default if row is None else self._load(row[0])
+
+    def get_many(self, keys, version=None):
+        full_keys = {self._key(key, version): key for key in keys}
+        found = {}
+        for chunk in chunks(full_keys):
+            rows = self._db.execute(
+                'SELECT key, value FROM cache WHERE key IN ({}) '
+                'AND (expires IS NULL OR expires > ?)'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                (*chunk, time.time()),
+            )
+            for key, value in rows:
+                found[full_keys[key]] = self._load(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            self._key(key, version), value, timeout,
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ? AND expires <= ?',
+            (key, time.time()),
+        )
+        return bool(self._write(
+            'INSERT OR IGNORE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            key, value, timeout,
+        ))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (
+                self.get_backend_timeout(timeout),
+                self._key(key, version),
+                time.time(),
+            ),
+        ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        # UPDATE ... RETURNING есть только с SQLite 3.35, поэтому новое
+        # значение читается отдельно в той же транзакции.
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            updated = db.execute(
+                'UPDATE cache SET value = value + ? WHERE key = ? '
+                "AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, key, time.time()),
+            ).rowcount
+            row = updated and db.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+        finally:
+            db.execute('COMMIT')
+        if not row:
+            raise ValueError(f"Key '{key}' not found")
+        return row[0]
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        for chunk in chunks(self._key(key, version) for key in keys):
+            self._db.execute(
+                'DELETE FROM cache WHERE key IN ({})'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                chunk,
+            )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def publish(self, keys):
+        """Записывает сброс ключей в журнал, None — сброс всего.
+
+        Возвращает номер записи журнала.
+        """
+        cursor = self._db.execute(
+            'INSERT INTO invalidation (keys) VALUES (?)',
+            (None if keys is None else json.dumps(list(keys)),),
+        )
+        if cursor.lastrowid % self.CULL_EVERY == 0:
+            self._db.execute(
+                'DELETE FROM invalidation WHERE id <= ?',
+                (cursor.lastrowid - self.LOG_SIZE,),
+            )
+        return cursor.lastrowid
+
+    def invalidations(self, since, skip=()):
+        """Сбросы после записи журнала since: (последняя запись, ключи).
+
+        Записи с номерами из skip пропускаются. Ключи равны None, если
+        надо сбросить всё: журнал прочитан впервые, часть записей уже
+        удалена или был сброс всего кеша.
+        """
+        db = self._db
+        if since is None:
+            last = db.execute('SELECT MAX(id) FROM invalidation').fetchone()
+            return last[0] or 0, None
+        rows = db.execute(
+            'SELECT id, keys FROM invalidation WHERE id > ? ORDER BY id',
+            (since,),
+        ).fetchall()
+        if not rows:
+            last = db.execute(
+                'SELECT MAX(id) FROM invalidation'
+            ).fetchone()[0] or 0
+            return last, None if last < since else []
+        last = rows[-1][0]
+        if rows[0][0] != since + 1:
+            return last, None
+        rows = [keys for row_id, keys in rows if row_id not in skip]
+        if any(keys is None for keys in rows):
+            return last, None
+        return last, [key for keys in rows for key in json.loads(keys)]
+
+
+class SyncState:
+    """Прочитанная часть журнала и счётчики попаданий процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seen = None
+        self.checked = None
+        self.published = set()
+        self.stats = Counter()
+
+
+SYNC_STATES = {}
+SYNC_STATES_LOCK = threading.Lock()
+STATS_KEY = 'tiered_cache_stats:{}'
+TIERS = ('l1', 'l2')
+
+
+class TieredCache(BaseCache):
+    """Кеш L1 в памяти процесса перед общим L2.
+
+    OPTIONS: L1 и L2 — алиасы кешей уровней, L1_TIMEOUT — наибольший
+    срок записи в L1, SYNC_INTERVAL — как часто читать журнал сбросов.
+    Кеш L2 должен уметь publish() и invalidations(), как SQLiteCache.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l1_alias = options.get('L1', 'l1')
+        self._l2_alias = options.get('L2', 'l2')
+        self.l1_timeout = options.get('L1_TIMEOUT', 60)
+        self.sync_interval = options.get('SYNC_INTERVAL', 1)
+        with SYNC_STATES_LOCK:
+            self._state = SYNC_STATES.setdefault(self._l1_alias, SyncState())
+
+    @property
+    def l1(self):
+        return caches[self._l1_alias]
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _timeouts(self, timeout):
+        """Сроки записи в L2 и L1: в L1 запись живёт не дольше L1_TIMEOUT."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return timeout, self.l1_timeout
+        return timeout, min(timeout, self.l1_timeout)
+
+    def _count(self, tier, hits, misses):
+        with self._state.lock:
+            self._state.stats[f'{tier}_hits'] += hits
+            self._state.stats[f'{tier}_misses'] += misses
+
+    def _publish(self, keys):
+        """Пишет сброс в журнал: свои записи процесс не перечитывает."""
+        row_id = self.l2.publish(keys)
+        with self._state.lock:
+            self._state.published.add(row_id)
+
+    def sync(self, force=False):
+        """Удаляет из L1 ключи, сброшенные другими процессами.
+
+        Сброс из другого процесса может разойтись с записью в L1 этого
+        процесса, поэтому запись живёт в L1 не дольше L1_TIMEOUT.
+        """
+        state = self._state
+        now = time.monotonic()
+        with state.lock:
+            if not force and state.checked is not None and (
+                now - state.checked < self.sync_interval
+            ):
+                return
+            state.checked = now
+            since = state.seen
+            published = set(state.published)
+            stats, state.stats = state.stats, Counter()
+        last, keys = self.l2.invalidations(since, published)
+        with state.lock:
+            state.seen = last
+            state.published -= {i for i in published if i <= last}
+        if keys is None:
+            self.l1.clear()
+        elif keys:
+            self.l1.delete_many(set(keys))
+        for name, delta in stats.items():
+            if delta:
+                key = STATS_KEY.format(name)
+                self.l2.add(key, 0, None)
+                self.l2.incr(key, delta)
+
+    def get_stats(self):
+        """Попадания и промахи по уровням, сумма по всем процессам."""
+        self.sync(force=True)
+        names = [f'{tier}_{kind}' for tier in TIERS
+                 for kind in ('hits', 'misses')]
+        values = self.l2.get_many([STATS_KEY.format(name) for name in names])
+        return {
+            tier: {
+                kind: values.get(STATS_KEY.format(f'{tier}_{kind}'), 0)
+                for kind in ('hits', 'misses')
+            }
+            for tier in TIERS
+        }
+
+    def reset_stats(self):
+        self.sync(force=True)
+        self.l2.delete_many([
+            STATS_KEY.format(f'{tier}_{kind}')
+            for tier in TIERS for kind in ('hits', 'misses')
+        ])
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        self.sync()
+        full_keys = {self._key(key, version): key for key in keys}
+        found = self.l1.get_many(full_keys)
+        self._count('l1', len(found), len(full_keys) - len(found))
+        missing = [key for key in full_keys if key not in found]
+        if missing:
+            from_l2 = self.l2.get_many(missing)
+            self._count('l2', len(from_l2), len(missing) - len(from_l2))
+            if from_l2:
+                self.l1.set_many(from_l2, self.l1_timeout)
+                found.update(from_l2)
+        return {full_keys[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        data = {self._key(key, version): value for key, value in data.items()}
+        l2_timeout, l1_timeout = self._timeouts(timeout)
+        self.l2.set_many(data, l2_timeout)
+        self._publish(data)
+        self.l1.set_many(data, l1_timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        l2_timeout, l1_timeout = self._timeouts(timeout)
+        if not self.l2.add(key, value, l2_timeout):
+            return False
+        self._publish([key])
+        self.l1.set(key, value, l1_timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        l2_timeout, l1_timeout = self._timeouts(timeout)
+        self.l1.touch(key, l1_timeout)
+        return self.l2.touch(key, l2_timeout)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        value = self.l2.incr(key, delta)
+        self._publish([key])
+        self.l1.set(key, value, self.l1_timeout)
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        self.l2.delete_many(keys)
+        self._publish(keys)
+        self.l1.delete_many(keys)
+
+    def clear(self):
+        self.l2.clear()
+        self._publish(None)
+        self.l1.clear()
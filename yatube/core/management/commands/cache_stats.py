@@ -0,0 +1,29 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import TieredCache
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания в кеш по уровням L1 и L2.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Сбросить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        cache = caches['default']
+        if not isinstance(cache, TieredCache):
+            raise CommandError('Кеш по умолчанию не двухуровневый.')
+        for tier, stats in cache.get_stats().items():
+            total = stats['hits'] + stats['misses']
+            rate = stats['hits'] / total * 100 if total else 0
+            self.stdout.write(
+                f'{tier.upper()}: попаданий {stats["hits"]}, промахов '
+                f'{stats["misses"]}, доля попаданий {rate:.1f}%'
+            )
+        if options['reset']:
+            cache.reset_stats()
@@ -0,0 +1,156 @@
+"""Отдача загруженных файлов из MEDIA_ROOT.
+
+Если перед Django стоит прокси (MEDIA_SENDFILE), ответ содержит только
+заголовки, а файл отдаёт сам прокси по X-Accel-Redirect (nginx) или
+X-Sendfile (Apache, lighttpd). Иначе файл отдаёт FileResponse: сервер
+WSGI с wsgi.file_wrapper передаёт его через sendfile без копирования в
+Python. Поддерживаются один диапазон байт (Range, If-Range), сильный
+ETag с If-None-Match и долгий immutable-кеш для имён с хешем.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+# Имена, в которых есть хеш содержимого или ссылки: такой файл под этим
+# именем не меняется.
+HASHED_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{32,64}\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+SENDFILE_HEADERS = {
+    'x-accel-redirect': 'X-Accel-Redirect',
+    'x-sendfile': 'X-Sendfile',
+}
+
+
+def media_path(name):
+    """Путь к файлу в MEDIA_ROOT; для чужих путей и каталогов — 404."""
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+    return path
+
+
+def file_etag(name, stat):
+    """Сильный ETag: хеш из имени или размер и время изменения."""
+    match = HASHED_NAME_RE.search(name)
+    if match:
+        return quote_etag(os.path.splitext(match.group())[0].lstrip('/'))
+    return quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+
+
+def byte_range(header, size):
+    """Диапазон (начало, конец включительно) из Range.
+
+    None — отдать файл целиком (нет заголовка, несколько диапазонов или
+    другие единицы), ValueError — диапазон вне файла.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError(header)
+    return first, last
+
+
+class RangeFile:
+    """Часть открытого файла от first до last включительно."""
+
+    def __init__(self, file, first, last):
+        self.file = file
+        self.file.seek(first)
+        self.remaining = last - first + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def sendfile_response(name, path):
+    header = SENDFILE_HEADERS[settings.MEDIA_SENDFILE]
+    response = HttpResponse()
+    if header == 'X-Accel-Redirect':
+        response[header] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+    else:
+        response[header] = path
+    return response
+
+
+def file_response(request, path, size, etag):
+    response_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if 'HTTP_RANGE' in request.META and if_range in (None, etag):
+        try:
+            response_range = byte_range(request.META['HTTP_RANGE'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(path, 'rb')
+    if response_range is None:
+        response = FileResponse(file)
+    else:
+        first, last = response_range
+        response = FileResponse(RangeFile(file, first, last), status=206)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = last - first + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_file(request, name, immutable=None):
+    """Ответ с файлом name из MEDIA_ROOT.
+
+    immutable=None определяет неизменность файла по хешу в имени.
+    """
+    path = media_path(name)
+    stat = os.stat(path)
+    etag = file_etag(name, stat)
+    if immutable is None:
+        immutable = bool(HASHED_NAME_RE.search(name))
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None and settings.MEDIA_SENDFILE:
+        response = sendfile_response(name, path)
+    if response is None:
+        response = file_response(request, path, stat.st_size, etag)
+    content_type, encoding = mimetypes.guess_type(path)
+    if response.status_code in (200, 206):
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if immutable:
+        patch_cache_control(
+            response, public=True,
+            max_age=settings.MEDIA_IMMUTABLE_MAX_AGE, immutable=True,
+        )
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_MAX_AGE
+        )
+    return response
@@ -0,0 +1,31 @@
+"""Запуск тестов с отдельным общим кешем."""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner, у которого кеш 'shared' — файл во временном каталоге.
+
+    Тесты сбрасывают кеш, поэтому файл кеша сервера им не подходит.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        self.cache_dir = tempfile.mkdtemp(prefix='yatube-cache-')
+        caches = copy.deepcopy(settings.CACHES)
+        caches['shared']['LOCATION'] = os.path.join(
+            self.cache_dir, 'cache.sqlite3'
+        )
+        self.cache_settings = override_settings(CACHES=caches)
+        self.cache_settings.enable()
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
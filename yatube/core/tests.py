@@ -1,6 +1,16 @@
+import os
+import shutil
+import tempfile
 from http import HTTPStatus
 
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from .cache import TieredCache
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +20,173 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': LOCMEM},
+    'worker1': {'BACKEND': LOCMEM, 'LOCATION': 'worker1'},
+    'worker2': {'BACKEND': LOCMEM, 'LOCATION': 'worker2'},
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(TEMP_CACHE_DIR, 'cache.sqlite3'),
+    },
+})
+class TieredCacheTests(TestCase):
+    """Два экземпляра с разными L1 ведут себя как два процесса."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.worker1, self.worker2 = (
+            TieredCache(None, {'OPTIONS': {
+                'L1': alias, 'L2': 'shared', 'SYNC_INTERVAL': 0,
+            }})
+            for alias in ('worker1', 'worker2')
+        )
+        self.worker1.clear()
+        self.worker2.sync(force=True)
+        self.worker1.reset_stats()
+
+    def test_values_shared(self):
+        """Запись одного процесса видна другому."""
+        self.worker1.set('key', {'value': 1})
+        self.assertEqual(self.worker2.get('key'), {'value': 1})
+        self.assertEqual(self.worker2.get_many(['key', 'nokey']), {
+            'key': {'value': 1},
+        })
+
+    def test_invalidation_broadcast(self):
+        """Запись и удаление сбрасывают L1 остальных процессов."""
+        self.worker1.set('key', 'old')
+        self.assertEqual(self.worker2.get('key'), 'old')
+        self.worker1.set('key', 'new')
+        self.assertEqual(self.worker2.get('key'), 'new')
+        self.worker1.delete('key')
+        self.assertIsNone(self.worker2.get('key'))
+        self.worker1.set('counter', 1, None)
+        self.assertEqual(self.worker2.get('counter'), 1)
+        self.assertEqual(self.worker1.incr('counter'), 2)
+        self.assertEqual(self.worker2.get('counter'), 2)
+        self.assertTrue(caches['worker2'].get_many(
+            [self.worker2.make_key('counter')]
+        ))
+        self.worker1.clear()
+        self.assertIsNone(self.worker2.get('counter'))
+
+    def test_incr_add_shared(self):
+        """add и incr атомарны на общем уровне."""
+        self.assertTrue(self.worker1.add('counter', 0, None))
+        self.assertFalse(self.worker2.add('counter', 5, None))
+        self.worker1.incr('counter')
+        self.worker2.incr('counter', 2)
+        self.assertEqual(self.worker1.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            self.worker2.incr('nokey')
+
+    def test_stats(self):
+        """Попадания и промахи считаются по уровням."""
+        self.worker1.set('key', 'value')
+        self.worker1.get('key')
+        self.worker2.get('key')
+        self.worker2.get('key')
+        self.worker2.get('nokey')
+        self.worker1.sync(force=True)
+        self.assertEqual(self.worker2.get_stats(), {
+            'l1': {'hits': 2, 'misses': 2},
+            'l2': {'hits': 1, 'misses': 1},
+        })
+
+    def test_shared_cache_isolated(self):
+        """Тесты пишут общий кеш не в файл кеша сервера."""
+        self.assertNotEqual(
+            os.path.dirname(settings.CACHES['shared']['LOCATION']),
+            settings.BASE_DIR,
+        )
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+HASHED_NAME = 'posts/ab/' + 'ab' * 32 + '.txt'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE=None)
+class MediaServingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ('plain.txt', HASHED_NAME):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'0123456789')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_file_served(self):
+        """Файл отдаётся с ETag, а хеш в имени делает его неизменным."""
+        response = self.client.get('/media/plain.txt')
+        self.assertEqual(b''.join(response), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response = self.client.get('/media/' + HASHED_NAME)
+        self.assertEqual(response['ETag'], '"' + 'ab' * 32 + '"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_if_none_match(self):
+        """Совпавший ETag даёт 304 без тела."""
+        etag = self.client.get('/media/plain.txt')['ETag']
+        response = self.client.get(
+            '/media/plain.txt', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_ranges(self):
+        """Один диапазон байт отдаётся частью файла."""
+        cases = (
+            ('bytes=2-5', HTTPStatus.PARTIAL_CONTENT, b'2345', 'bytes 2-5/10'),
+            ('bytes=7-', HTTPStatus.PARTIAL_CONTENT, b'789', 'bytes 7-9/10'),
+            ('bytes=-3', HTTPStatus.PARTIAL_CONTENT, b'789', 'bytes 7-9/10'),
+            ('bytes=0-1,4-5', HTTPStatus.OK, b'0123456789', None),
+            (
+                'bytes=20-',
+                HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, b'', 'bytes */10',
+            ),
+        )
+        for header, status, body, content_range in cases:
+            with self.subTest(header=header):
+                response = self.client.get(
+                    '/media/plain.txt', HTTP_RANGE=header
+                )
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(b''.join(response), body)
+                self.assertEqual(response.get('Content-Range'), content_range)
+        response = self.client.get(
+            '/media/plain.txt', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_outside_media_root(self):
+        """Пути вне MEDIA_ROOT и каталоги не отдаются."""
+        for url in ('/media/../manage.py', '/media/posts/', '/media/none'):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+                )
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        """С прокси файл отдаёт nginx по внутреннему адресу."""
+        response = self.client.get('/media/plain.txt')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/plain.txt'
+        )
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
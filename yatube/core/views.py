@@ -1,6 +1,9 @@
 from http import HTTPStatus
 
 from django.shortcuts import render
+from django.views.decorators.http import require_safe
+
+from .media import serve_file
 
 
 def page_not_found(request, exception):
@@ -22,3 +25,9 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@require_safe
+def media(request, path):
+    """Файл из MEDIA_ROOT, в том числе без DEBUG."""
+    return serve_file(request, path)
@@ -1,10 +1,24 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
-from .models import Comment, Follow, Group, Post
+from . import search
+from .models import Comment, Follow, Group, Post, Tag
+
+
+class FullTextSearchMixin:
+    """Поиск в списке по индексу FTS5 вместо LIKE по search_fields."""
+
+    search_index = None
+
+    def get_search_results(self, request, queryset, search_term):
+        subquery = search.matching_ids(self.search_index, search_term)
+        if subquery is None:
+            return queryset, False
+        return queryset.filter(pk__in=RawSQL(*subquery)), False
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -15,6 +29,7 @@ class PostAdmin(admin.ModelAdmin):
     )
     list_editable = ('group',)
     search_fields = ('text',)
+    search_index = search.POST_INDEX
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
@@ -32,13 +47,18 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = (
         'post',
         'author',
         'text',
+        'parent',
+        'depth',
     )
-    search_fields = ('post',)
+    # Место в ветке вычисляется один раз при создании (threads.set_path).
+    readonly_fields = ('parent',)
+    search_fields = ('text',)
+    search_index = search.COMMENT_INDEX
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
@@ -52,3 +72,9 @@ class FollowAdmin(admin.ModelAdmin):
     search_fields = ('user',)
     list_filter = ('author',)
     empty_value_display = '-пусто-'
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
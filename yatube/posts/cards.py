@@ -0,0 +1,96 @@
+"""Кеш отрисованных карточек постов.
+
+Ключ карточки содержит card_version поста, которую сигналы увеличивают
+при правке поста, изменении его группы и имени автора, поэтому старые
+карточки просто перестают читаться. Все карточки страницы читаются
+одним cache.get_many, отрисовываются только промахи. Попадания и
+промахи копятся в памяти процесса и пишутся в кеш не чаще раза в
+STATS_FLUSH_INTERVAL секунд, как статистика TieredCache: запись в общий
+кеш на каждый показ ленты стала бы основной нагрузкой чтения.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'includes/post.html'
+HITS_KEY = 'post_card_hits'
+MISSES_KEY = 'post_card_misses'
+STATS_FLUSH_INTERVAL = 10
+
+_stats_lock = threading.Lock()
+_stats = Counter()
+_flushed = time.monotonic()
+
+
+def card_key(post, show_group):
+    return f'post_card:{post.pk}:{post.card_version}:{int(show_group)}'
+
+
+def forget_cards(post):
+    cache.delete_many([
+        card_key(post, show_group) for show_group in (False, True)
+    ])
+
+
+def flush_stats():
+    """Переносит накопленные процессом попадания и промахи в кеш."""
+    global _stats, _flushed
+    with _stats_lock:
+        stats, _stats = _stats, Counter()
+        _flushed = time.monotonic()
+    for key, delta in stats.items():
+        if not delta:
+            continue
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, None)
+
+
+def count(hits, misses):
+    with _stats_lock:
+        _stats[HITS_KEY] += hits
+        _stats[MISSES_KEY] += misses
+        due = time.monotonic() - _flushed >= STATS_FLUSH_INTERVAL
+    if due:
+        flush_stats()
+
+
+def get_stats():
+    """Попадания и промахи кеша карточек с момента последнего сброса.
+
+    Другие процессы досылают свои счётчики не реже раза в
+    STATS_FLUSH_INTERVAL секунд.
+    """
+    flush_stats()
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    return stats.get(HITS_KEY, 0), stats.get(MISSES_KEY, 0)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def render_cards(posts, show_group=True):
+    """HTML карточек постов в порядке posts."""
+    keys = [card_key(post, show_group) for post in posts]
+    cards = cache.get_many(keys)
+    misses = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            misses[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'show_group': show_group}
+            )
+    if misses:
+        cache.set_many(misses, settings.POST_CARD_TIMEOUT)
+        cards.update(misses)
+    count(len(keys) - len(misses), len(misses))
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+
+from .models import FeedCounter, Follow, Post, UserStats
+
+ALL_POSTS_KEY = 'posts'
+# Ограничение SQLite на число параметров в одном запросе.
+KEYS_CHUNK_SIZE = 500
+
+
+def group_key(group_id):
+    return f'group:{group_id}'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def follow_key(user_id):
+    return f'follow:{user_id}'
+
+
+def tag_key(tag_id):
+    return f'tag:{tag_id}'
+
+
+def follow_feed_count_key(user_id):
+    return f'follow_feed_count:{user_id}'
+
+
+def follow_counters_enabled():
+    """Ведутся ли счётчики лент подписок.
+
+    Их ведёт только движок 'timeline': иначе каждый пост менял бы по
+    строке на подписчика, а слияние при чтении нужно как раз для
+    авторов, у которых подписчиков слишком много.
+    """
+    return settings.FOLLOW_FEED_ENGINE == 'timeline'
+
+
+def follow_feed_count(user_id):
+    """Размер ленты подписок без счётчика: сумма постов авторов.
+
+    Кешируется на FOLLOW_FEED_COUNT_TIMEOUT, подписка и отписка
+    сбрасывают кеш сразу.
+    """
+    key = follow_feed_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = UserStats.objects.filter(
+            user__following__user_id=user_id
+        ).aggregate(total=Sum('post_count'))['total'] or 0
+        cache.set(key, count, settings.FOLLOW_FEED_COUNT_TIMEOUT)
+    return count
+
+
+def forget_follow_feed_count(user_id):
+    cache.delete(follow_feed_count_key(user_id))
+
+
+def get_feed_count(key, queryset):
+    """Размер ленты из хранилища счётчиков.
+
+    Отсутствующий счётчик считается по queryset один раз и сохраняется,
+    дальше его поддерживают сигналы из posts.signals.
+    """
+    value = FeedCounter.objects.filter(key=key).values_list(
+        'value', flat=True
+    ).first()
+    if value is None:
+        counter, _ = FeedCounter.objects.get_or_create(
+            key=key,
+            defaults={'value': queryset.count()},
+        )
+        value = counter.value
+    return max(value, 0)
+
+
+def change_feed_counts(keys, delta):
+    """Атомарно сдвигает существующие счётчики на delta."""
+    keys = list(keys)
+    if not delta:
+        return
+    for start in range(0, len(keys), KEYS_CHUNK_SIZE):
+        FeedCounter.objects.filter(
+            key__in=keys[start:start + KEYS_CHUNK_SIZE]
+        ).update(value=F('value') + delta)
+
+
+def actual_user_stats(user_id):
+    """Поля UserStats пользователя, посчитанные по таблицам."""
+    return {
+        'post_count': Post.objects.filter(author_id=user_id).count(),
+        'follower_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
@@ -0,0 +1,68 @@
+"""ETag страниц лент и поста без их отрисовки.
+
+ETag собирается из версий содержимого (см. posts.versions), нескольких
+полей одной короткой выборки и пользователя запроса: шапка и кнопки
+на странице зависят от него. Если клиент присылает тот же ETag в
+If-None-Match, представление не вызывается и ответ — 304. ETag слабый:
+страница с формой содержит новую маску CSRF-токена при каждой
+отрисовке, но по смыслу не меняется.
+"""
+import hashlib
+
+from django.db.models import Exists, OuterRef
+
+from . import versions
+from .models import Follow, Group, Post, User
+
+
+def page_etag(request, *parts):
+    raw = '|'.join(
+        map(str, (request.get_full_path(), request.user.pk, *parts))
+    )
+    return f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'
+
+
+def index_etag(request):
+    return page_etag(request, *versions.get_versions([versions.FEED_VERSION]))
+
+
+def group_etag(request, slug):
+    group = Group.objects.filter(slug=slug).values_list(
+        'pk', 'title', 'description'
+    ).first()
+    if group is None:
+        return None
+    return page_etag(
+        request, *group,
+        *versions.get_versions([versions.group_version(group[0])]),
+    )
+
+
+def profile_etag(request, username):
+    author = User.objects.filter(username=username).annotate(
+        is_followed=Exists(Follow.objects.filter(
+            user_id=request.user.pk, author=OuterRef('pk')
+        )),
+    ).values_list(
+        'pk', 'first_name', 'last_name', 'stats__post_count',
+        'stats__follower_count', 'stats__following_count', 'is_followed',
+    ).first()
+    if author is None:
+        return None
+    return page_etag(
+        request, *author,
+        *versions.get_versions([versions.author_version(author[0])]),
+    )
+
+
+def post_etag(request, post_id):
+    # Только хранимые поля: правку и удаление комментариев, смену имён
+    # их авторов отражает comments_version (см. posts.signals).
+    post = Post.objects.filter(pk=post_id).values_list(
+        'card_version', 'author__stats__post_count',
+        'author__stats__follower_count', 'comment_count',
+        'comments_version',
+    ).first()
+    if post is None:
+        return None
+    return page_etag(request, *post)
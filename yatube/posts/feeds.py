@@ -0,0 +1,87 @@
+"""Запросы лент постов.
+
+Все ленты загружают авторов и группы тем же запросом, что и посты:
+шаблон includes/post.html обращается к post.author и post.group.slug
+для каждого поста, и без select_related страница из десяти постов
+стоила бы больше двадцати запросов.
+"""
+from django.conf import settings
+
+from . import counters, merge_feed
+from .models import Post, PostTag, TimelineEntry
+from .utils import get_paginator
+
+FEED_RELATED = ('author', 'group')
+TIMELINE_KEYSET_FIELDS = ('pub_date', 'post_id')
+
+
+def feed_queryset():
+    return Post.objects.select_related(*FEED_RELATED).order_by('-pub_date')
+
+
+def index_feed():
+    return feed_queryset()
+
+
+def group_feed(group):
+    return feed_queryset().filter(group=group)
+
+
+def author_feed(author):
+    return feed_queryset().filter(author=author)
+
+
+def follow_feed(user):
+    """Записи материализованной ленты подписок вместе с постами.
+
+    Пагинируются сами записи по ключу TIMELINE_KEYSET_FIELDS, страница
+    затем превращается в посты через posts_page.
+    """
+    return TimelineEntry.objects.filter(user=user).select_related(
+        *(f'post__{field}' for field in FEED_RELATED)
+    ).order_by('-pub_date', '-post_id')
+
+
+def posts_page(page):
+    """Заменяет записи ленты на странице их постами."""
+    page.object_list = [entry.post for entry in page.object_list]
+    return page
+
+
+def follow_page(request):
+    """Страница ленты подписок движком из FOLLOW_FEED_ENGINE."""
+    user = request.user
+    engine = settings.FOLLOW_FEED_ENGINE
+    if engine == 'join':
+        return get_paginator(
+            request,
+            feed_queryset().filter(author__following__user=user),
+            count=counters.follow_feed_count(user.pk),
+        )
+    if engine in ('merge', 'hybrid'):
+        return merge_feed.follow_page(
+            request, user, feed_queryset(),
+            counters.follow_feed_count(user.pk), hybrid=engine == 'hybrid',
+        )
+    return posts_page(get_paginator(
+        request,
+        follow_feed(user),
+        count_key=counters.follow_key(user.pk),
+        keyset_fields=TIMELINE_KEYSET_FIELDS,
+    ))
+
+
+def tag_feed(tag):
+    """Связи тега с постами вместе с постами, новые первыми."""
+    return PostTag.objects.filter(tag=tag).select_related(
+        *(f'post__{field}' for field in FEED_RELATED)
+    ).order_by('-pub_date', '-post_id')
+
+
+def tag_page(request, tag):
+    return posts_page(get_paginator(
+        request,
+        tag_feed(tag),
+        count_key=counters.tag_key(tag.pk),
+        keyset_fields=TIMELINE_KEYSET_FIELDS,
+    ))
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import normalize_image
 from .models import Comment, Post
 
 
@@ -18,6 +20,17 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка к посту',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        normalized = normalize_image(image)
+        if normalized is not image:
+            image.close()
+            # Файлы запроса закрываются вместе с ним.
+            self.files[self.add_prefix('image')] = normalized
+        return normalized
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,89 @@
+"""Приведение загруженных картинок постов к виду для хранения.
+
+Загрузка пишется во временный файл (FILE_UPLOAD_HANDLERS), размер
+картинки проверяется по заголовку до декодирования. Затем картинка
+поворачивается по EXIF, уменьшается до IMAGE_UPLOAD_MAX_SIZE по большей
+стороне и пересохраняется в том же формате без метаданных во временный
+файл, который хранилище потом просто перемещает. JPEG в CMYK и других
+режимах переводится в RGB через свой ICC-профиль в sRGB: профиль
+исходного режима к RGB-картинке не прикладывается.
+"""
+import io
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image, ImageCms, ImageOps
+
+# Параметры пересохранения по форматам; другие форматы и анимация
+# сохраняются как загружены.
+ENCODERS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 85, 'method': 6},
+    'GIF': {'optimize': True},
+}
+KEPT_INFO = ('transparency',)
+
+
+def fit_size(size, max_size):
+    scale = max_size / max(size)
+    return round(size[0] * scale), round(size[1] * scale)
+
+
+def to_rgb(image, icc_profile):
+    """Картинка в RGB; цвета по ICC-профилю пересчитываются в sRGB."""
+    if icc_profile:
+        try:
+            return ImageCms.profileToProfile(
+                image,
+                ImageCms.ImageCmsProfile(io.BytesIO(icc_profile)),
+                ImageCms.createProfile('sRGB'),
+                outputMode='RGB',
+            )
+        except (ImageCms.PyCMSError, OSError):
+            # Испорченный профиль или профиль не того режима.
+            pass
+    return image.convert('RGB')
+
+
+def normalize_image(upload):
+    """Проверенная и пересохранённая картинка из загруженного файла."""
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s пикселей.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+    image_format = image.format
+    if image_format not in ENCODERS or getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+    if max(image.size) > max_size:
+        image.draft(image.mode, fit_size(image.size, max_size))
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    if max(image.size) > max_size:
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = to_rgb(image, icc_profile)
+        icc_profile = None
+    # EXIF, XMP, комментарии и текстовые блоки не переносятся.
+    image.info = {
+        key: value for key, value in image.info.items()
+        if key in KEPT_INFO
+    }
+    normalized = TemporaryUploadedFile(
+        upload.name, upload.content_type, 0, None
+    )
+    options = dict(ENCODERS[image_format])
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    image.save(normalized.file, image_format, **options)
+    normalized.size = normalized.file.tell()
+    normalized.seek(0)
+    return normalized
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters, tags
+from posts.models import FeedCounter, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Находит хештеги в существующих постах и связывает посты с '
+        'тегами. Посты читаются пачками по id, каждая пачка — '
+        'отдельная транзакция.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.only('pk', 'text', 'pub_date').order_by('pk')
+        last_pk = 0
+        scanned = linked = 0
+        while True:
+            chunk = list(
+                posts.filter(pk__gt=last_pk)[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            with transaction.atomic():
+                linked += tags.link_posts(chunk)
+            scanned += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f'Просмотрено постов: {scanned}')
+        # Счётчики лент тегов пересчитаются при следующем чтении.
+        FeedCounter.objects.filter(
+            key__startswith=counters.tag_key('')
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {scanned}, тегов в них: {linked}'
+        ))
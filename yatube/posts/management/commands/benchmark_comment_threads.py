@@ -0,0 +1,92 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import threads
+from posts.models import Comment, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время выборки веток комментариев на временно '
+        'созданных широких и глубоких ветках. Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=500)
+        parser.add_argument('--replies', type=int, default=20)
+        parser.add_argument('--deep', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def reply(self, post, author, text, parent=None):
+        comment = Comment(
+            post=post, author=author, text=text, parent=parent
+        )
+        comment.save()
+        return comment
+
+    def seed(self, options):
+        # Комментарии создаются по одному: путь пишет сигнал post_save.
+        author = User.objects.create_user(username='benchmark_commenter')
+        post = Post.objects.create(author=author, text='Пост для веток')
+        wide = None
+        for i in range(options['threads']):
+            wide = self.reply(post, author, f'Ветка {i}')
+            for j in range(options['replies']):
+                self.reply(post, author, f'Ответ {j}', wide)
+        deep = parent = self.reply(post, author, 'Глубокая ветка')
+        for i in range(options['deep']):
+            parent = self.reply(post, author, f'Уровень {i}', parent)
+        _, next_start = threads.thread_page(post.pk)
+        return {
+            'post': post,
+            'wide': wide,
+            'deep': deep,
+            'next_start': next_start,
+        }
+
+    def queries(self, data):
+        post_id = data['post'].pk
+        return {
+            'first page': lambda: threads.thread_page(post_id),
+            'second page': lambda: threads.thread_page(
+                post_id, data['next_start']
+            ),
+            'wide thread': lambda: list(
+                threads.subtree(post_id, data['wide'].pk)
+            ),
+            'deep thread': lambda: list(
+                threads.subtree(post_id, data['deep'].pk)
+            ),
+        }
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix()} {sql}', params
+            )
+            return '\n    '.join(
+                ' '.join(str(value) for value in row)
+                for row in cursor.fetchall()
+            )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            data = self.seed(options)
+            for name, query in self.queries(data).items():
+                query()
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    query()
+                elapsed = (
+                    (time.perf_counter() - started) / options['repeat'] * 1000
+                )
+                self.stdout.write(f'{name:<20} {elapsed:>10.2f} ms')
+            for name, queryset in (
+                ('page', threads.preview_queryset(data['post'].pk)),
+                ('thread', threads.subtree(data['post'].pk, data['wide'].pk)),
+            ):
+                self.stdout.write(f'{name}:\n    {self.explain(queryset)}')
+            transaction.set_rollback(True)
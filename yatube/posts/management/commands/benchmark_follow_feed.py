@@ -0,0 +1,121 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from posts import feeds, merge_feed
+from posts.models import Follow, Post, TimelineEntry, User, UserStats
+
+ENGINES = ('join', 'timeline', 'merge')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает движки ленты подписок на временно созданных данных. '
+        'Все созданные записи откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followees',
+            type=int,
+            nargs='+',
+            default=[10, 1000, 10000],
+            help='Число авторов, на которых подписан читатель.',
+        )
+        parser.add_argument(
+            '--posts-per-author',
+            type=int,
+            default=5,
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Число повторов каждого замера.',
+        )
+
+    def seed(self, followees, posts_per_author):
+        reader = User.objects.create_user(username='benchmark_reader')
+        User.objects.bulk_create(
+            User(username=f'benchmark_author_{i}') for i in range(followees)
+        )
+        authors = list(User.objects.filter(
+            username__startswith='benchmark_author_'
+        ).values_list('pk', flat=True))
+        UserStats.objects.bulk_create(
+            UserStats(user_id=author_id, follower_count=1)
+            for author_id in authors
+        )
+        Follow.objects.bulk_create(
+            Follow(user=reader, author_id=author_id) for author_id in authors
+        )
+        Post.objects.bulk_create(
+            (
+                Post(author_id=author_id, text=f'Пост {i}')
+                for author_id in authors
+                for i in range(posts_per_author)
+            ),
+            batch_size=500,
+        )
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user=reader,
+                    post_id=post_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                ) for post_id, author_id, pub_date in Post.objects.filter(
+                    author_id__in=Follow.objects.filter(
+                        user=reader
+                    ).values('author_id')
+                ).values_list('pk', 'author_id', 'pub_date').iterator()
+            ),
+            batch_size=500,
+        )
+        return reader, authors
+
+    def measure(self, request, repeat):
+        feeds.follow_page(request)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            page = feeds.follow_page(request)
+            list(page)
+        return (time.perf_counter() - started) / repeat * 1000, page
+
+    def benchmark(self, followees, posts_per_author, repeat):
+        factory = RequestFactory()
+        url = reverse('posts:follow_index')
+        reader, authors = self.seed(followees, posts_per_author)
+        try:
+            for engine in ENGINES:
+                with override_settings(FOLLOW_FEED_ENGINE=engine):
+                    request = factory.get(url)
+                    request.user = reader
+                    first_ms, page = self.measure(request, repeat)
+                    request = factory.get(url, {'after': page.next_cursor})
+                    request.user = reader
+                    next_ms, _ = self.measure(request, repeat)
+                self.stdout.write(
+                    f'{followees:>8} {engine:>10} '
+                    f'{first_ms:>12.2f} {next_ms:>12.2f}'
+                )
+        finally:
+            cache.delete_many(
+                [merge_feed.recent_key(author_id) for author_id in authors]
+            )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"followees":>8} {"engine":>10} '
+            f'{"first, ms":>12} {"next, ms":>12}'
+        )
+        for followees in options['followees']:
+            with transaction.atomic():
+                self.benchmark(
+                    followees, options['posts_per_author'], options['repeat']
+                )
+                transaction.set_rollback(True)
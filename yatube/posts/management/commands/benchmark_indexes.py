@@ -0,0 +1,152 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts import feeds
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import KeysetPaginator
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время запросов лент с индексами и без них '
+        'на временно созданных данных. Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def seed(self, options):
+        User.objects.bulk_create(
+            User(username=f'benchmark_author_{i}')
+            for i in range(options['authors'])
+        )
+        authors = list(User.objects.filter(
+            username__startswith='benchmark_author_'
+        ).values_list('pk', flat=True))
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'benchmark-{i}', description='')
+            for i in range(options['groups'])
+        )
+        groups = list(Group.objects.filter(
+            slug__startswith='benchmark-'
+        ).values_list('pk', flat=True))
+        # Даты публикации раскладываются по времени, поэтому auto_now_add
+        # на время заполнения отключается.
+        pub_date = Post._meta.get_field('pub_date')
+        pub_date.auto_now_add = False
+        now = timezone.now()
+        try:
+            Post.objects.bulk_create(
+                (
+                    Post(
+                        author_id=random.choice(authors),
+                        group_id=random.choice(groups + [None]),
+                        text=f'Пост {i}',
+                        pub_date=now - timedelta(minutes=i),
+                    ) for i in range(options['posts'])
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        finally:
+            pub_date.auto_now_add = True
+        post = Post.objects.filter(author_id__in=authors).latest('pub_date')
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    post=post,
+                    author_id=random.choice(authors),
+                    text=f'Комментарий {i}',
+                ) for i in range(options['comments'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Follow.objects.bulk_create(
+            Follow(user_id=authors[0], author_id=author_id)
+            for author_id in authors[1:]
+        )
+        return {
+            'author': User.objects.get(pk=authors[-1]),
+            'group': Group.objects.get(pk=groups[-1]),
+            'post': post,
+            'reader': authors[0],
+        }
+
+    def queries(self, data):
+        middle = feeds.index_feed()[Post.objects.count() // 2]
+        deep_cursor = (middle.pub_date, middle.pk)
+        return {
+            'index': feeds.index_feed()[:10],
+            'index keyset deep': KeysetPaginator(
+                feeds.index_feed(), 10
+            ).object_list.filter(pub_date__lt=deep_cursor[0])[:11],
+            'group': feeds.group_feed(data['group'])[:10],
+            'author': feeds.author_feed(data['author'])[:10],
+            'author count': Post.objects.filter(author=data['author']),
+            'comments': Comment.objects.filter(
+                post=data['post']
+            ).order_by('-created')[:50],
+            'follow exists': Follow.objects.filter(
+                user_id=data['reader'], author=data['author']
+            ),
+        }
+
+    def explain(self, queryset, title):
+        # Метка в тексте запроса не даёт sqlite3 взять план
+        # из кеша подготовленных выражений после DROP INDEX.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix()} {sql} '
+                f'/* {title} */',
+                params,
+            )
+            return '\n    '.join(
+                ' '.join(str(value) for value in row)
+                for row in cursor.fetchall()
+            )
+
+    def run_query(self, name, queryset):
+        queryset = queryset.all()
+        if name == 'author count':
+            return queryset.count()
+        if name == 'follow exists':
+            return queryset.exists()
+        return list(queryset)
+
+    def measure(self, title, data, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in self.queries(data).items():
+            self.run_query(name, queryset)
+            started = time.perf_counter()
+            for _ in range(repeat):
+                self.run_query(name, queryset)
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            self.stdout.write(f'{name:<20} {elapsed:>10.2f} ms')
+            self.stdout.write(f'    {self.explain(queryset, title)}')
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(index.name)}'
+                    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            data = self.seed(options)
+            self.measure('С индексами', data, options['repeat'])
+            self.drop_indexes()
+            self.measure('Без индексов', data, options['repeat'])
+            transaction.set_rollback(True)
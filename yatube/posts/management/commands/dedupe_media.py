@@ -0,0 +1,98 @@
+import os
+from functools import partial
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import storage, thumbnails
+from posts.models import Post
+from posts.signals import THUMBNAIL_FIELDS, bump_cards
+from posts.storage import content_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Переименовывает картинки постов по содержимому и удаляет '
+        'одинаковые копии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет сделано.',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post.image.field.storage
+        upload_to = Post.image.field.upload_to
+        renamed = removed = saved = 0
+        for root, _, files in os.walk(storage.path(upload_to)):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, storage.location).replace(
+                    os.sep, '/'
+                )
+                with open(path, 'rb') as source:
+                    new_name = content_name(
+                        os.path.join(upload_to, filename), File(source)
+                    )
+                if new_name == name:
+                    continue
+                duplicate = storage.exists(new_name)
+                self.stdout.write(
+                    f'{name} -> {new_name}{" (копия)" if duplicate else ""}'
+                )
+                if duplicate:
+                    removed += 1
+                    saved += os.path.getsize(path)
+                else:
+                    renamed += 1
+                if options['dry_run']:
+                    continue
+                # Сначала фиксируются ссылки, потом меняются файлы: после
+                # сбоя между шагами старый файл остаётся на месте, и
+                # повторный запуск доделывает перенос.
+                needs_variants = self.relink(name, new_name)
+                if duplicate:
+                    os.remove(path)
+                else:
+                    os.makedirs(
+                        os.path.dirname(storage.path(new_name)), exist_ok=True
+                    )
+                    os.replace(path, storage.path(new_name))
+                if needs_variants:
+                    thumbnails.schedule(
+                        new_name, partial(self.set_variants, new_name)
+                    )
+        self.stdout.write(self.style.SUCCESS(
+            f'Переименовано: {renamed}, удалено копий: {removed} '
+            f'({saved / 1024:.0f} КБ)'
+        ))
+
+    @transaction.atomic
+    def relink(self, name, new_name):
+        """Переводит посты на новое имя и убирает старые варианты.
+
+        Возвращает True, если у нового имени ещё нет готовых вариантов:
+        их нужно поставить в очередь, когда файл окажется на месте.
+        Поставить их после сбоя поможет generate_thumbnails.
+        """
+        storage.lock(new_name)
+        ready = Post.objects.filter(image=new_name).exclude(
+            image_variants=''
+        ).values(*THUMBNAIL_FIELDS).first()
+        if not ready:
+            ready = {
+                'thumbnail': '', 'image_variants': '',
+                'thumbnail_width': None, 'thumbnail_height': None,
+            }
+        bump_cards(Post.objects.filter(image=name), image=new_name, **ready)
+        transaction.on_commit(lambda: thumbnails.delete_variants(name))
+        return not ready['image_variants']
+
+    def set_variants(self, image_name, variants):
+        bump_cards(
+            Post.objects.filter(image=image_name),
+            **thumbnails.image_fields(variants),
+        )
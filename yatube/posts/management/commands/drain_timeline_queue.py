@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import PendingFanout
+
+CHUNK_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет записи в ленты подписок, которые фоновый поток не '
+        'успел выполнить до перезапуска. Запускается при старте сервера '
+        'или периодически, например из cron.'
+    )
+
+    def handle(self, *args, **options):
+        done = 0
+        while True:
+            # Выполненные записи удаляются, поэтому каждая пачка — голова
+            # очереди.
+            chunk = list(PendingFanout.objects.all()[:CHUNK_SIZE])
+            if not chunk:
+                break
+            for pending in chunk:
+                timeline.run_pending(pending)
+            done += len(chunk)
+        self.stdout.write(
+            self.style.SUCCESS(f'Выполнено записей в ленты: {done}')
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import cards
+
+
+class Command(BaseCommand):
+    help = 'Показывает долю попаданий в кеш карточек постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Сбросить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        hits, misses = cards.get_stats()
+        total = hits + misses
+        rate = hits / total * 100 if total else 0
+        self.stdout.write(
+            f'Попаданий: {hits}, промахов: {misses}, доля попаданий: '
+            f'{rate:.1f}%'
+        )
+        if options['reset']:
+            cards.reset_stats()
@@ -0,0 +1,39 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import thumbnails
+from posts.models import Post
+from posts.signals import bump_cards
+
+
+class Command(BaseCommand):
+    help = 'Делает варианты картинок постов, у которых их ещё нет.'
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').filter(
+            Q(thumbnail='') | Q(image_variants='')
+        ).order_by().values_list('image', flat=True).distinct()
+        executor = thumbnails.get_executor()
+        futures = {
+            executor.submit(
+                thumbnails.make_variants, *thumbnails.variant_args(name)
+            ): name
+            for name in names.iterator()
+        }
+        done = failed = 0
+        for future in as_completed(futures):
+            name = futures[future]
+            if future.exception() is not None:
+                failed += 1
+                self.stderr.write(f'{name}: {future.exception()}')
+                continue
+            bump_cards(
+                Post.objects.filter(image=name),
+                **thumbnails.image_fields(future.result()),
+            )
+            done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}, ошибок: {failed}'
+        ))
@@ -0,0 +1,62 @@
+import json
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def kilobytes(size):
+    return f'{size / 1024:.0f} КБ'
+
+
+def saving(size, base):
+    return f'{(1 - size / base) * 100:+.1f}%' if base else '—'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём вариантов картинок постов с JPEG той же '
+        'ширины и с прежней миниатюрой 960 JPEG.'
+    )
+
+    def handle(self, *args, **options):
+        images = dict(
+            Post.objects.exclude(image_variants='').order_by().values_list(
+                'image', 'image_variants'
+            ).distinct()
+        )
+        originals = 0
+        sizes = Counter()
+        for image, variants in images.items():
+            if default_storage.exists(image):
+                originals += default_storage.size(image)
+            for ext, width, _, name in json.loads(variants):
+                if default_storage.exists(name):
+                    sizes[width, ext] += default_storage.size(name)
+        self.stdout.write(
+            f'Картинок: {len(images)}, оригиналы: {kilobytes(originals)}'
+        )
+        fallback = thumbnails.FALLBACK_FORMAT
+        for width in sorted({width for width, _ in sizes}):
+            base = sizes[width, fallback]
+            formats = ', '.join(
+                f'{image_format.ext} {kilobytes(sizes[width, ext])} '
+                f'({saving(sizes[width, ext], base)})'
+                for image_format in thumbnails.FORMATS
+                for ext in [image_format.ext]
+                if ext != fallback and (width, ext) in sizes
+            )
+            self.stdout.write(
+                f'Ширина {width}: {fallback} {kilobytes(base)}, {formats}'
+            )
+        best = thumbnails.FORMATS[0].ext
+        old = sizes[thumbnails.FEED_WIDTH, fallback]
+        for width in (min(thumbnails.VARIANT_WIDTHS), thumbnails.FEED_WIDTH):
+            self.stdout.write(
+                f'{best} {width} против прежней миниатюры '
+                f'{fallback} {thumbnails.FEED_WIDTH}: '
+                f'{saving(sizes[width, best], old)}'
+            )
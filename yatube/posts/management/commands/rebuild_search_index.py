@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает поисковый индекс постов и комментариев заново, '
+        'например после массовой загрузки в обход сигналов.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts, comments = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {posts}, комментариев: {comments}'
+        ))
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts import counters
+from posts.models import FeedCounter, Follow, Post, PostTag, User, UserStats
+
+USER_STATS_FIELDS = ('post_count', 'follower_count', 'following_count')
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики лент и статистику пользователей и '
+        'исправляет расхождения, недостающая статистика создаётся. '
+        'Запускается периодически, например из cron.'
+    )
+
+    def actual_counts(self):
+        actual = {counters.ALL_POSTS_KEY: Post.objects.count()}
+        for row in Post.objects.values('author_id').annotate(
+            total=Count('pk')
+        ).order_by():
+            actual[counters.author_key(row['author_id'])] = row['total']
+        for row in Post.objects.exclude(group=None).values(
+            'group_id'
+        ).annotate(total=Count('pk')).order_by():
+            actual[counters.group_key(row['group_id'])] = row['total']
+        for row in Follow.objects.values('user_id').annotate(
+            total=Count('author__posts')
+        ).order_by():
+            actual[counters.follow_key(row['user_id'])] = row['total']
+        for row in PostTag.objects.values('tag_id').annotate(
+            total=Count('pk')
+        ).order_by():
+            actual[counters.tag_key(row['tag_id'])] = row['total']
+        return actual
+
+    def grouped_counts(self, queryset, field):
+        return dict(
+            queryset.values_list(field).annotate(total=Count('pk')).order_by()
+        )
+
+    def actual_user_stats(self):
+        counts = (
+            self.grouped_counts(Post.objects, 'author_id'),
+            self.grouped_counts(Follow.objects, 'author_id'),
+            self.grouped_counts(Follow.objects, 'user_id'),
+        )
+        return {
+            user_id: tuple(count.get(user_id, 0) for count in counts)
+            for user_id in User.objects.values_list('pk', flat=True)
+        }
+
+    def reconcile_user_stats(self):
+        actual = self.actual_user_stats()
+        fixed = 0
+        for stats in UserStats.objects.select_for_update():
+            values = actual.pop(stats.pk, None)
+            current = tuple(
+                getattr(stats, field) for field in USER_STATS_FIELDS
+            )
+            if values is None or current == values:
+                continue
+            self.stdout.write(f'stats:{stats.pk}: {current} -> {values}')
+            for field, value in zip(USER_STATS_FIELDS, values):
+                setattr(stats, field, value)
+            stats.save(update_fields=USER_STATS_FIELDS)
+            fixed += 1
+        # Оставшиеся в actual пользователи без строки статистики.
+        for user_id, values in actual.items():
+            self.stdout.write(f'stats:{user_id}: нет -> {values}')
+        UserStats.objects.bulk_create(
+            UserStats(user_id=user_id, **dict(zip(USER_STATS_FIELDS, values)))
+            for user_id, values in actual.items()
+        )
+        return fixed + len(actual)
+
+    def handle(self, *args, **options):
+        fixed = 0
+        with transaction.atomic():
+            actual = self.actual_counts()
+            for counter in FeedCounter.objects.select_for_update():
+                value = actual.get(counter.key, 0)
+                if counter.value != value:
+                    self.stdout.write(
+                        f'{counter.key}: {counter.value} -> {value}'
+                    )
+                    counter.value = value
+                    counter.save(update_fields=('value',))
+                    fixed += 1
+            fixed_stats = self.reconcile_user_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Исправлено счётчиков: {fixed}, '
+                f'статистик пользователей: {fixed_stats}'
+            )
+        )
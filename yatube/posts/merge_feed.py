@@ -0,0 +1,206 @@
+"""Лента подписок, собираемая при чтении (fan-out on read).
+
+Для каждого автора в кеше хранится ограниченный список последних постов
+в виде пар (pub_date, id) от новых к старым. Лента пользователя строится
+слиянием через кучу списков всех авторов, на которых он подписан, после
+чего посты страницы загружаются одним запросом. Запись поста не
+размножается по подписчикам, поэтому авторы с огромным числом
+подписчиков не порождают тысячи строк TimelineEntry.
+"""
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger
+
+from .models import Follow, Post, TimelineEntry
+from .utils import (CURSOR_BEFORE, KEYSET_FIELDS, CountedPaginator,
+                    KeysetPage, KeysetPaginator, get_cursor, keyset_filter,
+                    set_cursors)
+
+TIMELINE_FIELDS = ('pub_date', 'post_id')
+
+
+def recent_key(author_id):
+    return f'recent_posts:{author_id}'
+
+
+def forget_recent(author_id):
+    cache.delete(recent_key(author_id))
+
+
+def keyset_items(queryset, fields, after=None, before=None, limit=None):
+    """Пары (pub_date, id) из queryset от новых к старым."""
+    date_field, id_field = fields
+    queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+    if before is not None:
+        rows = list(
+            queryset.filter(keyset_filter(fields, before, 'gt')).reverse()
+            .values_list(date_field, id_field)[:limit]
+        )
+        rows.reverse()
+        return rows
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(fields, after, 'lt'))
+    return list(queryset.values_list(date_field, id_field)[:limit])
+
+
+def load_recent(author_ids):
+    """Списки последних постов авторов, недостающие читаются из базы."""
+    keys = {recent_key(author_id): author_id for author_id in author_ids}
+    recent = {
+        keys[key]: items for key, items in cache.get_many(keys).items()
+    }
+    missing = {}
+    for key, author_id in keys.items():
+        if author_id not in recent:
+            recent[author_id] = missing[key] = keyset_items(
+                Post.objects.filter(author_id=author_id),
+                KEYSET_FIELDS,
+                limit=settings.FOLLOW_FEED_RECENT_LIMIT,
+            )
+    if missing:
+        cache.set_many(missing, settings.FOLLOW_FEED_RECENT_TIMEOUT)
+    return recent
+
+
+def author_items(author_id, items, after=None, before=None, limit=None):
+    """Срез списка автора у курсора.
+
+    Список в кеше обрезан, поэтому когда срез уходит глубже самого
+    старого закешированного поста, он читается из базы по индексу.
+    """
+    truncated = len(items) >= settings.FOLLOW_FEED_RECENT_LIMIT
+    if before is not None:
+        if truncated and before < items[-1]:
+            return keyset_items(
+                Post.objects.filter(author_id=author_id),
+                KEYSET_FIELDS, before=before, limit=limit,
+            )
+        return [item for item in items if item > before][-limit:]
+    selected = [item for item in items if after is None or item < after]
+    if truncated and len(selected) < limit:
+        return keyset_items(
+            Post.objects.filter(author_id=author_id),
+            KEYSET_FIELDS, after=after, limit=limit,
+        )
+    return selected[:limit]
+
+
+def merge(streams, limit, newest_first=True):
+    """Первые limit элементов слияния убывающих списков без повторов.
+
+    С newest_first=False берутся limit самых старых элементов, что
+    нужно для страницы перед курсором. Результат всегда убывает.
+    """
+    if newest_first:
+        ordered = heapq.merge(*streams, reverse=True)
+    else:
+        ordered = heapq.merge(*(reversed(stream) for stream in streams))
+    seen = set()
+    merged = []
+    for item in ordered:
+        if item[1] not in seen:
+            seen.add(item[1])
+            merged.append(item)
+            if len(merged) == limit:
+                break
+    if not newest_first:
+        merged.reverse()
+    return merged
+
+
+def merged_items(user, after=None, before=None, limit=None, hybrid=False):
+    """Пары (pub_date, id) ленты подписок пользователя.
+
+    В гибридном режиме авторы с числом подписчиков ниже порога уже
+    разложены по TimelineEntry, и сливаются только списки популярных
+    авторов и материализованная лента.
+    """
+    follows = Follow.objects.filter(user=user)
+    streams = []
+    if hybrid:
+        follows = follows.filter(
+            author__stats__follower_count__gte=(
+                settings.FOLLOW_FEED_HYBRID_THRESHOLD
+            )
+        )
+        streams.append(keyset_items(
+            TimelineEntry.objects.filter(user=user),
+            TIMELINE_FIELDS, after=after, before=before, limit=limit,
+        ))
+    author_ids = list(follows.values_list('author_id', flat=True))
+    for author_id, items in load_recent(author_ids).items():
+        streams.append(author_items(
+            author_id, items, after=after, before=before, limit=limit,
+        ))
+    return merge(streams, limit, newest_first=before is None)
+
+
+class CappedPage(Page):
+    """Нумерованная страница, за последней из которых лента продолжается."""
+
+    def __init__(self, object_list, number, paginator, more=False):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return super().has_next() or self.more
+
+
+def load_posts(queryset, items):
+    posts = queryset.in_bulk([post_id for _, post_id in items])
+    return [posts[post_id] for _, post_id in items if post_id in posts]
+
+
+def follow_page(request, user, queryset, count, hybrid=False):
+    """Страница ленты подписок, собранной слиянием.
+
+    queryset задаёт, как загружать посты страницы, count - размер ленты
+    для нумерованных страниц.
+    """
+    per_page = settings.POSTS_COUNT
+    param, cursor = get_cursor(request)
+    if cursor is not None:
+        keyset_paginator = KeysetPaginator(queryset, per_page)
+        if param == CURSOR_BEFORE:
+            items = merged_items(
+                user, before=cursor, limit=per_page + 1, hybrid=hybrid
+            )
+            return KeysetPage(
+                load_posts(queryset, items[-per_page:]),
+                keyset_paginator,
+                True,
+                len(items) > per_page,
+            )
+        items = merged_items(
+            user, after=cursor, limit=per_page + 1, hybrid=hybrid
+        )
+        return KeysetPage(
+            load_posts(queryset, items[:per_page]),
+            keyset_paginator,
+            len(items) > per_page,
+            True,
+        )
+    # Нумерованные страницы берутся из закешированных списков авторов
+    # и не уходят глубже FOLLOW_FEED_RECENT_LIMIT, дальше лента
+    # листается курсором.
+    limit = max(
+        settings.FOLLOW_FEED_RECENT_LIMIT // per_page * per_page, per_page
+    )
+    paginator = CountedPaginator(queryset, per_page, min(count, limit))
+    try:
+        number = paginator.validate_number(request.GET.get('page'))
+    except PageNotAnInteger:
+        number = 1
+    except EmptyPage:
+        number = paginator.num_pages
+    offset = (number - 1) * per_page
+    items = merged_items(user, limit=offset + per_page, hybrid=hybrid)
+    page = CappedPage(
+        load_posts(queryset, items[offset:offset + per_page]),
+        number,
+        paginator,
+        more=count > limit,
+    )
+    return set_cursors(page)
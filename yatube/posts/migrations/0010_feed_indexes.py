@@ -0,0 +1,73 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:02
+
+import django.db.models.expressions
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def follow_count_subquery(Follow, field):
+    return Coalesce(Subquery(
+        Follow.objects.filter(**{field: OuterRef('user')}).values(
+            field
+        ).annotate(total=Count('id')).values('total')
+    ), Value(0))
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Оставляет по одной подписке на пару (user, author).
+
+    Если что-то удалено, счётчики подписок пересчитываются, а счётчики
+    лент подписок сбрасываются и будут посчитаны заново при чтении.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    FeedCounter = apps.get_model('posts', 'FeedCounter')
+    UserStats = apps.get_model('posts', 'UserStats')
+    deleted, _ = Follow.objects.filter(user=F('author')).delete()
+    keep_ids = Follow.objects.values('user', 'author').annotate(
+        keep_id=Min('id')
+    ).values('keep_id')
+    duplicates, _ = Follow.objects.exclude(id__in=keep_ids).delete()
+    if deleted or duplicates:
+        UserStats.objects.update(
+            follower_count=follow_count_subquery(Follow, 'author'),
+            following_count=follow_count_subquery(Follow, 'user'),
+        )
+        FeedCounter.objects.filter(key__startswith='follow:').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_date_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='prevent_self_follow'),
+        ),
+    ]
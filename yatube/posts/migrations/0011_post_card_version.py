@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='card_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Меняется при каждом изменении, видимом в карточке', verbose_name='Версия карточки поста'),
+        ),
+    ]
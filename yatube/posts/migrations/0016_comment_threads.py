@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+SEGMENT_WIDTH = 7
+MAX_SEGMENT = len(DIGITS) ** SEGMENT_WIDTH - 1
+
+
+def root_path(comment_id):
+    number = MAX_SEGMENT - comment_id
+    digits = []
+    for _ in range(SEGMENT_WIDTH):
+        number, digit = divmod(number, len(DIGITS))
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits))
+
+
+def fill_paths(apps, schema_editor):
+    """Существующие комментарии становятся корнями веток."""
+    Comment = apps.get_model('posts', 'Comment')
+    comments = []
+    for comment in Comment.objects.only('pk').iterator():
+        comment.path = root_path(comment.pk)
+        comments.append(comment)
+        if len(comments) == BATCH_SIZE:
+            Comment.objects.bulk_update(comments, ['path'])
+            comments = []
+    Comment.objects.bulk_update(comments, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Глубина в ветке'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на комментарий'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, help_text='Пути родителей и id комментария, см. posts.threads', max_length=255, verbose_name='Путь в ветке'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_serial',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Растёт при каждом ответе в ветке этого корня', verbose_name='Счётчик ответов ветки'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thread_index',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Номер ответа в ветке'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# Токенизатор unicode61 приводит к нижнему регистру и кириллицу,
+# remove_diacritics 2 убирает диакритику и у составных символов.
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_comment_threads'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                f'CREATE VIRTUAL TABLE posts_post_fts USING fts5('
+                f'text, {TOKENIZE})',
+                'INSERT INTO posts_post_fts (rowid, text) '
+                'SELECT id, text FROM posts_post',
+            ],
+            reverse_sql=['DROP TABLE posts_post_fts'],
+        ),
+        migrations.RunSQL(
+            sql=[
+                f'CREATE VIRTUAL TABLE posts_comment_fts USING fts5('
+                f'text, post_id UNINDEXED, {TOKENIZE})',
+                'INSERT INTO posts_comment_fts (rowid, text, post_id) '
+                'SELECT id, text, post_id FROM posts_comment',
+            ],
+            reverse_sql=['DROP TABLE posts_comment_fts'],
+        ),
+    ]
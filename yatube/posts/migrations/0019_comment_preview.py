@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_previews(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Comment.objects.filter(
+        models.Q(depth=0)
+        | models.Q(thread_index__lte=settings.COMMENT_REPLIES_PREVIEW)
+    ).update(in_preview=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='in_preview',
+            field=models.BooleanField(default=False, editable=False, help_text='Корень или один из первых ответов ветки', verbose_name='В превью ветки'),
+        ),
+        migrations.RunPython(mark_previews, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(in_preview=True), fields=['post', 'path'], name='comment_preview_path_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_mediafile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingFanout',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=32, verbose_name='Задача')),
+                ('args', models.CharField(max_length=64, verbose_name='Аргументы')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата постановки')),
+            ],
+            options={
+                'verbose_name': 'Отложенная запись в ленты',
+                'verbose_name_plural': 'Отложенные записи в ленты',
+                'ordering': ['pk'],
+            },
+        ),
+    ]
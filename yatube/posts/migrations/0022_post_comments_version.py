@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_pendingfanout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Меняется при каждом изменении комментариев поста', verbose_name='Версия комментариев'),
+        ),
+    ]
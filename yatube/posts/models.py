@@ -1,6 +1,12 @@
+import json
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.functional import cached_property
+
+from . import resize, thumbnails
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -54,17 +60,85 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True,
+    )
+    card_version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия карточки поста',
+        help_text='Меняется при каждом изменении, видимом в карточке',
+    )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+    comments_version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия комментариев',
+        help_text='Меняется при каждом изменении комментариев поста',
+    )
+    thumbnail = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра картинки',
+        help_text='Путь готовой миниатюры в хранилище файлов',
+    )
+    image_width = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Ширина картинки',
+        help_text='Читается из файла при смене картинки',
+    )
+    thumbnail_width = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Ширина миниатюры',
+    )
+    thumbnail_height = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Высота миниатюры',
+    )
+    image_variants = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Варианты картинки',
+        help_text='JSON-список [формат, ширина, высота, путь] вариантов',
     )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:settings.POST_CHAR_COUNT]
 
+    @cached_property
+    def image_srcsets(self):
+        """srcset готовых вариантов, до их генерации — ссылки уменьшения."""
+        if self.image_variants:
+            return thumbnails.srcsets(json.loads(self.image_variants))
+        return resize.srcsets(self.image.name, self.image_width or 0)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -88,15 +162,73 @@ class Comment(models.Model):
         verbose_name='Дата создания комментария',
         help_text='Дата, в которую комментарий был опубликован'
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='replies',
+        verbose_name='Ответ на комментарий',
+    )
+    path = models.CharField(
+        max_length=255,
+        default='',
+        editable=False,
+        verbose_name='Путь в ветке',
+        help_text='Пути родителей и id комментария, см. posts.threads',
+    )
+    depth = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Глубина в ветке',
+    )
+    thread_index = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Номер ответа в ветке',
+    )
+    reply_serial = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Счётчик ответов ветки',
+        help_text='Растёт при каждом ответе в ветке этого корня',
+    )
+    in_preview = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='В превью ветки',
+        help_text='Корень или один из первых ответов ветки',
+    )
 
     class Meta:
-        ordering = ['-created']
+        ordering = ['-created', '-id']
         verbose_name = 'Комментарий к посту'
         verbose_name_plural = 'Комменты'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+            models.Index(
+                fields=['post', 'path'], name='comment_post_path_idx'
+            ),
+            # Страница веток читает только превью: одна длинная ветка не
+            # удлиняет диапазон индекса.
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_preview_path_idx',
+                condition=models.Q(in_preview=True),
+            ),
+        ]
 
     def __str__(self):
         return self.text[:settings.COMMENT_LENGTH]
 
+    @property
+    def hidden_replies(self):
+        """Сколько ответов ветки этого корня не попало в превью."""
+        return max(self.reply_serial - settings.COMMENT_REPLIES_PREVIEW, 0)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -115,3 +247,210 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка на автора'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='prevent_self_follow',
+            ),
+        ]
+
+
+class FeedCounter(models.Model):
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Ключ ленты',
+    )
+    value = models.IntegerField(
+        default=0,
+        verbose_name='Количество постов в ленте',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик ленты'
+        verbose_name_plural = 'Счётчики лент'
+
+    def __str__(self):
+        return f'{self.key}: {self.value}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+    follower_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Владелец ленты',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста',
+    )
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_post'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.post_id}'
+
+
+class PendingFanout(models.Model):
+    """Отложенная запись в ленты подписок.
+
+    Строка пишется в транзакции изменения и удаляется после выполнения,
+    поэтому работа, не выполненная фоновым потоком до перезапуска,
+    остаётся в таблице до команды drain_timeline_queue.
+    """
+    task = models.CharField(
+        max_length=32,
+        verbose_name='Задача',
+    )
+    args = models.CharField(
+        max_length=64,
+        verbose_name='Аргументы',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата постановки',
+    )
+
+    class Meta:
+        ordering = ['pk']
+        verbose_name = 'Отложенная запись в ленты'
+        verbose_name_plural = 'Отложенные записи в ленты'
+
+    def __str__(self):
+        return f'{self.task}({self.args})'
+
+
+class Tag(models.Model):
+    name = models.CharField(
+        max_length=settings.TAG_MAX_LENGTH,
+        unique=True,
+        verbose_name='Тег',
+        help_text='Тег без #, в нижнем регистре',
+    )
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Тег'
+        verbose_name_plural = 'Теги'
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='links',
+        verbose_name='Тег',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tag_links',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста',
+    )
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        verbose_name = 'Тег поста'
+        verbose_name_plural = 'Теги постов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tag', 'post'], name='unique_post_tag'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', '-pub_date', '-post'],
+                name='posttag_tag_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.tag}: {self.post_id}'
+
+
+class MediaFile(models.Model):
+    """Строка-замок картинки в хранилище по содержимому.
+
+    Загрузка картинки и удаление картинки без ссылок сначала пишут эту
+    строку, поэтому идут по очереди: файл не удаляется между повторной
+    загрузкой того же содержимого и сохранением её поста.
+    """
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Имя файла',
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
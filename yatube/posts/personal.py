@@ -0,0 +1,120 @@
+"""Персональные фрагменты страниц с общим кешем.
+
+Страница в общем кеше одна для всех посетителей: вместо шапки,
+переключателя лент и кнопки подписки в ней стоят метки. После чтения
+из кеша метки заменяются фрагментами, отрисованными для текущего
+пользователя, — это дёшево по сравнению с отрисовкой ленты.
+"""
+import hashlib
+import re
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from . import versions
+from .models import Follow
+
+FRAGMENTS = {}
+PLACEHOLDER_RE = re.compile(r'<!--personal:(\w+)\?([^>]*)-->')
+
+
+def fragment(name, template):
+    """Регистрирует фрагмент: шаблон и функцию его контекста.
+
+    Функция получает запрос и строковые аргументы метки.
+    """
+    def decorator(get_context):
+        FRAGMENTS[name] = template, get_context
+        return get_context
+    return decorator
+
+
+@fragment('header', 'includes/header.html')
+def header_context(request):
+    return {}
+
+
+@fragment('switcher', 'includes/switcher.html')
+def switcher_context(request):
+    return {}
+
+
+@fragment('follow_button', 'includes/follow_button.html')
+def follow_button_context(request, author):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user,
+        author__username=author,
+    ).exists()
+    return {'author_username': author, 'following': following}
+
+
+def render_fragment(request, name, kwargs):
+    template, get_context = FRAGMENTS[name]
+    return render_to_string(
+        template, get_context(request, **kwargs), request=request
+    )
+
+
+def placeholder(name, kwargs):
+    return f'<!--personal:{name}?{urlencode(kwargs)}-->'
+
+
+def punch(request, content):
+    """Заменяет метки фрагментами для пользователя запроса."""
+    return PLACEHOLDER_RE.sub(
+        lambda match: render_fragment(
+            request, match.group(1), dict(parse_qsl(match.group(2)))
+        ),
+        content,
+    )
+
+
+def is_shared_render(request):
+    return getattr(request, 'shared_render', False)
+
+
+def page_key(key_prefix, page_versions, request):
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return '.'.join(
+        ['shared_page', key_prefix, *map(str, page_versions), url]
+    )
+
+
+def shared_cache_page(timeout, key_prefix, get_names):
+    """Общий для всех посетителей кеш страницы.
+
+    Страница отрисовывается с метками вместо персональных фрагментов и
+    кешируется по адресу и версиям содержимого, без учёта cookie.
+    get_names(request, *args, **kwargs) возвращает имена версий, от
+    которых зависит страница.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            key = page_key(
+                key_prefix,
+                versions.get_versions(get_names(request, *args, **kwargs)),
+                request,
+            )
+            content = cache.get(key)
+            if content is not None:
+                return HttpResponse(punch(request, content))
+            request.shared_render = True
+            try:
+                response = view_func(request, *args, **kwargs)
+            finally:
+                request.shared_render = False
+            if response.streaming:
+                return response
+            content = response.content.decode(response.charset)
+            if response.status_code == 200:
+                cache.set(key, content, timeout)
+            response.content = punch(request, content)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,158 @@
+"""Уменьшение картинок постов по подписанной ссылке.
+
+Ссылка содержит имя картинки и преобразование: ширину, высоту, обрезку
+и формат, подписанные SECRET_KEY, поэтому шаблоны только вычисляют
+адреса, а размеры не подделать. Результат пишется на диск рядом с
+вариантами картинки под хешем ссылки и дальше отдаётся готовым. В одном
+процессе одновременно идёт не больше IMAGE_RESIZE_WORKERS уменьшений,
+а одинаковые запросы ждут уже начатое, а не делают его повторно.
+"""
+import hashlib
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from . import thumbnails
+
+SALT = 'posts.resize'
+RESIZED_DIR = 'resized'
+
+Transform = namedtuple('Transform', 'image_name width height crop ext')
+
+
+class ResizeBusy(Exception):
+    """Все места для уменьшения заняты дольше IMAGE_RESIZE_WAIT."""
+
+
+_lock = threading.Lock()
+_in_flight = {}
+_slots = None
+
+
+def get_slots():
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(
+                settings.IMAGE_RESIZE_WORKERS
+            )
+    return _slots
+
+
+def resize_url(image_name, width, height=None, crop=False,
+               ext=thumbnails.FALLBACK_FORMAT):
+    token = signing.dumps(
+        [image_name, width, height, crop, ext], salt=SALT, compress=True
+    )
+    return reverse('posts:resized_image', args=[token])
+
+
+def load(token):
+    """Преобразование из ссылки; неверная подпись — signing.BadSignature."""
+    return Transform(*signing.loads(token, salt=SALT))
+
+
+def cached_name(token, transform):
+    """Имя результата: папка вариантов картинки и хеш ссылки."""
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    return (
+        f'{thumbnails.variant_prefix(transform.image_name)}/'
+        f'{RESIZED_DIR}/{digest[:32]}.{transform.ext}'
+    )
+
+
+def image_format(ext):
+    for candidate in thumbnails.FORMATS:
+        if candidate.ext == ext:
+            return candidate
+    raise signing.BadSignature(f'Неизвестный формат: {ext}')
+
+
+def make_resized(source_path, path, transform):
+    with Image.open(source_path) as image:
+        width = transform.width
+        height = transform.height or round(
+            image.size[1] * width / image.size[0]
+        )
+        image.draft('RGB', thumbnails.draft_size(image.size, (width, height)))
+        image = image.convert('RGB')
+    if transform.crop:
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    else:
+        image.thumbnail((width, height), Image.LANCZOS)
+    thumbnails.save_atomic(image, path, image_format(transform.ext))
+
+
+class Flight:
+    """Начатое уменьшение: его ждут одинаковые запросы."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+def get_resized(token):
+    """Имя готового результата в хранилище и его формат.
+
+    При промахе дискового кеша картинка сначала уменьшается. Для
+    отсутствующей картинки поднимает OSError, при занятых местах —
+    ResizeBusy. Ждавшие чужого уменьшения получают его ошибку.
+    """
+    transform = load(token)
+    variant_format = image_format(transform.ext)
+    name = cached_name(token, transform)
+    if default_storage.exists(name):
+        return name, variant_format
+    with _lock:
+        flight = _in_flight.get(name)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[name] = Flight()
+    if not leader:
+        flight.done.wait(settings.IMAGE_RESIZE_WAIT)
+        if default_storage.exists(name):
+            return name, variant_format
+        if flight.error is not None:
+            raise flight.error
+        raise ResizeBusy(name)
+    slots = get_slots()
+    try:
+        if not slots.acquire(timeout=settings.IMAGE_RESIZE_WAIT):
+            raise ResizeBusy(name)
+        try:
+            make_resized(
+                default_storage.path(transform.image_name),
+                default_storage.path(name),
+                transform,
+            )
+        finally:
+            slots.release()
+    except Exception as error:
+        flight.error = error
+        raise
+    finally:
+        with _lock:
+            del _in_flight[name]
+        flight.done.set()
+    return name, variant_format
+
+
+def srcsets(image_name, source_width):
+    """Те же srcset, что у готовых вариантов, но по ссылкам уменьшения.
+
+    Как и у готовых вариантов, ширины больше исходной source_width не
+    выводятся.
+    """
+    variants = []
+    for width in thumbnails.variant_widths(source_width):
+        size = thumbnails.variant_size(width)
+        for variant_format in thumbnails.FORMATS:
+            variants.append([variant_format.ext, *size, resize_url(
+                image_name, *size, crop=True, ext=variant_format.ext
+            )])
+    return thumbnails.srcsets(variants, url=str)
@@ -0,0 +1,196 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Тексты лежат в виртуальных таблицах SQLite FTS5 (миграция 0017):
+инвертированный индекс находит слова без просмотра всех строк, как
+LIKE '%слово%'. Строки индекса — rowid поста или комментария и его
+текст, их обновляют сигналы при сохранении и удалении, а команда
+rebuild_search_index собирает индекс заново. Посты и комментарии
+ищутся отдельно, сортируются по релевантности bm25 и листаются
+курсором (ранг, id).
+"""
+import base64
+import binascii
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .feeds import FEED_RELATED
+from .models import Comment, Post
+
+POST_INDEX = 'posts_post_fts'
+COMMENT_INDEX = 'posts_comment_fts'
+POST = 'post'
+COMMENT = 'comment'
+
+# Границы совпадения во фрагменте: символы, которых нет в тексте после
+# экранирования, заменяются на <mark>.
+MATCH_START, MATCH_END = '\x02', '\x03'
+SNIPPET_TOKENS = 16
+MAX_TERMS = 10
+TERM_RE = re.compile(r'\w+')
+
+SearchResult = namedtuple(
+    'SearchResult', 'kind post comment snippet rank pk'
+)
+
+KINDS = (POST, COMMENT)
+MIN_PREFIX_LENGTH = 3
+
+# Ранги bm25 разных таблиц несравнимы: у каждой своя статистика слов,
+# поэтому посты и комментарии ищутся и листаются отдельно.
+SEARCH_SQL = '''
+    SELECT pk, post_id, rank, snippet FROM (
+        SELECT rowid AS pk, {post_id} AS post_id, bm25({index}) AS rank,
+               snippet({index}, 0, %s, %s, '…', %s) AS snippet
+        FROM {index} WHERE {index} MATCH %s
+    )
+    WHERE %s IS NULL OR rank > %s OR (rank = %s AND pk > %s)
+    ORDER BY rank, pk
+    LIMIT %s
+'''
+KIND_SQL = {
+    POST: SEARCH_SQL.format(index=POST_INDEX, post_id='rowid'),
+    COMMENT: SEARCH_SQL.format(index=COMMENT_INDEX, post_id='post_id'),
+}
+
+
+def match_query(text):
+    """Запрос FTS5 из строки пользователя: все слова, длинные — префиксы.
+
+    Слова короче MIN_PREFIX_LENGTH ищутся целиком: префикс из одной-двух
+    букв подходит почти ко всем строкам индекса. Слова берутся в
+    кавычки, поэтому синтаксис FTS5 в строке не работает и не вызывает
+    ошибок. Пустой запрос — None.
+    """
+    terms = TERM_RE.findall(text.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(
+        f'"{term}"*' if len(term) >= MIN_PREFIX_LENGTH else f'"{term}"'
+        for term in terms
+    )
+
+
+def encode_cursor(result):
+    raw = f'{result.rank!r}|{result.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает курсор, для испорченного курсора возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        rank, pk = raw.split('|')
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(MATCH_START, '<mark>').replace(
+            MATCH_END, '</mark>'
+        )
+    )
+
+
+def search(text, kind=POST, after=None, limit=None):
+    """Страница постов или комментариев и курсор следующей (или None)."""
+    query = match_query(text)
+    if query is None:
+        return [], None
+    limit = limit or settings.SEARCH_RESULTS_COUNT
+    rank, pk = after or (None, None)
+    with connection.cursor() as cursor:
+        cursor.execute(KIND_SQL[kind], [
+            MATCH_START, MATCH_END, SNIPPET_TOKENS, query,
+            rank, rank, rank, pk, limit + 1,
+        ])
+        rows = cursor.fetchall()
+    posts = Post.objects.select_related(*FEED_RELATED).in_bulk(
+        {row[1] for row in rows}
+    )
+    comments = {}
+    if kind == COMMENT:
+        comments = Comment.objects.select_related('author').in_bulk(
+            row[0] for row in rows
+        )
+    results = [
+        SearchResult(
+            kind, posts.get(post_id), comments.get(pk),
+            highlight(snippet), rank, pk,
+        )
+        for pk, post_id, rank, snippet in rows
+    ]
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor(results[-1])
+    # Строки индекса без поста пропускаются до пересборки индекса.
+    return [
+        result for result in results
+        if result.post is not None
+        and (result.kind == POST or result.comment is not None)
+    ], next_cursor
+
+
+def matching_ids(index, text):
+    """Подзапрос id записей, подходящих под запрос, для фильтра pk__in."""
+    query = match_query(text)
+    if query is None:
+        return None
+    return f'SELECT rowid FROM {index} WHERE {index} MATCH %s', [query]
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {POST_INDEX} WHERE rowid = %s', [post.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {POST_INDEX} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def index_comment(comment):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENT_INDEX} WHERE rowid = %s', [comment.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {COMMENT_INDEX} (rowid, text, post_id) '
+            f'VALUES (%s, %s, %s)',
+            [comment.pk, comment.text, comment.post_id],
+        )
+
+
+def unindex(index, pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {index} WHERE rowid = %s', [pk])
+
+
+def rebuild():
+    """Собирает индекс заново из таблиц постов и комментариев.
+
+    Возвращает число проиндексированных постов и комментариев.
+    """
+    with connection.cursor() as cursor:
+        for index, columns, table in (
+            (POST_INDEX, 'text', Post._meta.db_table),
+            (COMMENT_INDEX, 'text, post_id', Comment._meta.db_table),
+        ):
+            cursor.execute(f'DELETE FROM {index}')
+            cursor.execute(
+                f'INSERT INTO {index} (rowid, {columns}) '
+                f'SELECT id, {columns} FROM {table}'
+            )
+            cursor.execute(
+                f"INSERT INTO {index} ({index}) VALUES ('optimize')"
+            )
+    return Post.objects.count(), Comment.objects.count()
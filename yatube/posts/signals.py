@@ -0,0 +1,403 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import DEFERRED, F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import (cards, counters, merge_feed, search, storage, tags, threads,
+               thumbnails, timeline, versions)
+from .models import (Comment, Follow, Group, MediaFile, Post, PostTag, User,
+                     UserStats)
+
+# Поля автора, которые видны в карточке поста.
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+THUMBNAIL_FIELDS = (
+    'thumbnail', 'thumbnail_width', 'thumbnail_height', 'image_variants',
+)
+
+
+def follower_ids(author_id):
+    return Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+
+
+def change_user_stats(user_id, field, delta):
+    """Сдвигает поле статистики пользователя, не опуская его ниже нуля.
+
+    Отсутствующая строка (пользователь создан в обход сигналов)
+    создаётся при увеличении со значениями, посчитанными по таблицам.
+    При уменьшении строки может не быть, потому что удаляется сам
+    пользователь, поэтому её восстанавливает только
+    reconcile_feed_counts.
+    """
+    stats = UserStats.objects.filter(pk=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    if stats.update(**{field: F(field) + delta}) or delta < 0:
+        return
+    UserStats.objects.get_or_create(
+        user_id=user_id, defaults=counters.actual_user_stats(user_id)
+    )
+
+
+def author_posts_count(author_id):
+    return counters.get_feed_count(
+        counters.author_key(author_id),
+        Post.objects.filter(author_id=author_id),
+    )
+
+
+def post_feed_keys(post, group_id):
+    keys = [counters.ALL_POSTS_KEY, counters.author_key(post.author_id)]
+    if group_id is not None:
+        keys.append(counters.group_key(group_id))
+    if counters.follow_counters_enabled():
+        keys.extend(
+            counters.follow_key(user_id)
+            for user_id in follower_ids(post.author_id)
+        )
+    return keys
+
+
+def image_name(image):
+    return getattr(image, 'name', image) or ''
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминает исходные группу и картинку, чтобы заметить их смену."""
+    instance._loaded_group_id = instance.__dict__.get(
+        'group_id', DEFERRED
+    )
+    instance._loaded_image = image_name(
+        instance.__dict__.get('image', DEFERRED)
+    )
+
+
+@receiver(pre_save, sender=Post)
+def bump_post_card(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance.card_version += 1
+
+
+def image_width(image):
+    """Ширина картинки по заголовку файла, для недоступной — None."""
+    if not image:
+        return None
+    try:
+        return image.width
+    except (OSError, SuspiciousFileOperation):
+        return None
+
+
+@receiver(pre_save, sender=Post)
+def forget_thumbnail(sender, instance, raw=False, **kwargs):
+    """Миниатюра старой картинки не подходит к новой.
+
+    Ширина новой картинки запоминается здесь, чтобы ссылки уменьшения
+    строились без чтения файла.
+    """
+    if raw:
+        return
+    if image_name(instance.image) != instance._loaded_image:
+        instance.thumbnail = instance.image_variants = ''
+        instance.thumbnail_width = instance.thumbnail_height = None
+        instance.image_width = image_width(instance.image)
+    elif not getattr(instance.image, '_committed', True):
+        # Новая загрузка ещё под своим именем: оно сменится при записи.
+        instance.image_width = image_width(instance.image)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_group_id = instance._loaded_group_id
+    if created:
+        counters.change_feed_counts(
+            post_feed_keys(instance, instance.group_id), 1
+        )
+        change_user_stats(instance.author_id, 'post_count', 1)
+        timeline.schedule(timeline.fan_out_post, instance.pk)
+        merge_feed.forget_recent(instance.author_id)
+    elif old_group_id not in (DEFERRED, instance.group_id):
+        if old_group_id is not None:
+            counters.change_feed_counts(
+                [counters.group_key(old_group_id)], -1
+            )
+        if instance.group_id is not None:
+            counters.change_feed_counts(
+                [counters.group_key(instance.group_id)], 1
+            )
+
+
+def release_image(name):
+    """Удаляет картинку и её варианты, если на неё больше нет ссылок.
+
+    Картинки адресуются по содержимому и бывают общими у нескольких
+    постов, поэтому ссылки проверяются после фиксации транзакции под
+    замком имени (см. posts.storage). Файлы вне папки картинок постов
+    не трогаются.
+    """
+    field = Post.image.field
+    if name is DEFERRED or not name.startswith(field.upload_to):
+        return
+
+    def delete_unreferenced():
+        with transaction.atomic():
+            storage.lock(name)
+            if Post.objects.filter(image=name).exists():
+                return
+            MediaFile.objects.filter(name=name).delete()
+            field.storage.delete(name)
+            thumbnails.delete_variants(name)
+
+    transaction.on_commit(delete_unreferenced)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    release_image(image_name(instance.image))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_feed_counts(
+        post_feed_keys(instance, instance.group_id), -1
+    )
+    change_user_stats(instance.author_id, 'post_count', -1)
+    merge_feed.forget_recent(instance.author_id)
+    cards.forget_cards(instance)
+
+
+def post_versions(author_id, group_ids):
+    """Имена версий лент, в которых показаны посты автора и групп."""
+    return [
+        versions.FEED_VERSION,
+        versions.author_version(author_id),
+        *(
+            versions.group_version(group_id)
+            for group_id in group_ids
+            if group_id not in (None, DEFERRED)
+        ),
+    ]
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_feed_version(sender, instance, raw=False, **kwargs):
+    """Сбрасывает ленты поста, при переносе — обеих групп."""
+    if not raw:
+        versions.bump_versions(*post_versions(
+            instance.author_id,
+            {instance._loaded_group_id, instance.group_id},
+        ))
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, created, raw=False, **kwargs):
+    """Ставит в очередь варианты новой картинки поста.
+
+    Варианты той же картинки у другого поста просто копируются.
+    """
+    name = image_name(instance.image)
+    if raw or name == instance._loaded_image:
+        return
+    if not created:
+        release_image(instance._loaded_image)
+    if not name:
+        return
+    ready = Post.objects.filter(image=name).exclude(
+        image_variants=''
+    ).values(*THUMBNAIL_FIELDS).first()
+    if ready:
+        bump_cards(Post.objects.filter(pk=instance.pk), **ready)
+        return
+    thumbnails.schedule(name, lambda variants: bump_cards(
+        Post.objects.filter(image=name),
+        **thumbnails.image_fields(variants),
+    ))
+
+
+def change_follow_count(follow, sign):
+    if not counters.follow_counters_enabled():
+        counters.forget_follow_feed_count(follow.user_id)
+        return
+    counters.change_feed_counts(
+        [counters.follow_key(follow.user_id)],
+        sign * author_posts_count(follow.author_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_follow_count(instance, 1)
+        change_user_stats(instance.author_id, 'follower_count', 1)
+        change_user_stats(instance.user_id, 'following_count', 1)
+        timeline.schedule(
+            timeline.backfill, instance.user_id, instance.author_id
+        )
+        if timeline.crossed_threshold(instance.author_id, 1):
+            timeline.schedule(timeline.rebalance, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    change_follow_count(instance, -1)
+    change_user_stats(instance.author_id, 'follower_count', -1)
+    change_user_stats(instance.user_id, 'following_count', -1)
+    timeline.schedule(timeline.prune, instance.user_id, instance.author_id)
+    if timeline.crossed_threshold(instance.author_id, -1):
+        timeline.schedule(timeline.rebalance, instance.author_id)
+
+
+def bump_comments(posts, **changes):
+    """Меняет версию комментариев постов: от неё зависит ETag поста."""
+    posts.update(comments_version=F('comments_version') + 1, **changes)
+
+
+def change_comment_count(post_id, delta):
+    bump_comments(
+        Post.objects.filter(pk=post_id),
+        comment_count=Greatest(F('comment_count') + delta, 0),
+    )
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        change_comment_count(instance.post_id, 1)
+    else:
+        bump_comments(Post.objects.filter(pk=instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+def set_comment_path(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        threads.set_path(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, update_fields=None, **kwargs):
+    # Загруженные фикстуры (raw) тоже попадают в поисковый индекс.
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.unindex(search.POST_INDEX, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def sync_post_tags(sender, instance, raw=False, update_fields=None,
+                   **kwargs):
+    if raw:
+        return
+    if update_fields is None or 'text' in update_fields:
+        tags.sync_post_tags(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def count_deleted_post_tags(sender, instance, **kwargs):
+    """Связи с тегами удаляются каскадом, их счётчики — здесь."""
+    counters.change_feed_counts(
+        [
+            counters.tag_key(tag_id)
+            for tag_id in PostTag.objects.filter(
+                post=instance
+            ).values_list('tag_id', flat=True)
+        ],
+        -1,
+    )
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    search.unindex(search.COMMENT_INDEX, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+def bump_cards(posts, **changes):
+    """Сбрасывает карточки постов и ленты, в которых они показаны.
+
+    changes — поля, которые меняются вместе с версией карточки.
+    """
+    names = {versions.FEED_VERSION}
+    for author_id, group_id in posts.order_by().values_list(
+        'author_id', 'group_id'
+    ).distinct():
+        names.update(post_versions(author_id, {group_id}))
+    posts.update(card_version=F('card_version') + 1, **changes)
+    versions.bump_versions(*names)
+
+
+@receiver(post_save, sender=Group)
+def bump_group_cards(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        bump_cards(Post.objects.filter(group=instance))
+
+
+@receiver(pre_delete, sender=Group)
+def bump_deleted_group_cards(sender, instance, **kwargs):
+    bump_cards(Post.objects.filter(group=instance))
+
+
+@receiver(pre_save, sender=User)
+def bump_author_cards(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    """Сбрасывает карточки постов автора при смене его имени.
+
+    Меняется и версия комментариев постов, где он писал: имя видно
+    в комментариях.
+    """
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not CARD_USER_FIELDS & set(
+        update_fields
+    ):
+        return
+    old = User.objects.filter(pk=instance.pk).values(
+        *CARD_USER_FIELDS
+    ).first()
+    if old and any(
+        old[field] != getattr(instance, field) for field in CARD_USER_FIELDS
+    ):
+        bump_cards(Post.objects.filter(author=instance))
+        bump_comments(Post.objects.filter(
+            pk__in=Comment.objects.filter(author=instance).values('post_id')
+        ))
+
+
+@receiver(post_save, sender=Post)
+def remember_saved_group(sender, instance, **kwargs):
+    """Сохранённые группа и картинка становятся исходными.
+
+    Стоит в конце модуля, чтобы подключаться после остальных
+    обработчиков post_save поста: им нужны значения до записи.
+    """
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = image_name(instance.image)
@@ -0,0 +1,54 @@
+"""Хранилище картинок постов, адресуемое по содержимому.
+
+Файл называется SHA-256 своего содержимого, поэтому одинаковые загрузки
+получают одно имя: второй раз файл не пишется, а миниатюры, которые
+называются по имени картинки, тоже общие. Файл удаляется, только когда
+на него не ссылается ни один пост (см. posts.signals.release_image).
+
+Загрузка и удаление одного имени идут под замком строки MediaFile до
+конца транзакции: иначе удаление файла без ссылок могло бы пройти между
+повторной загрузкой того же содержимого и сохранением её поста.
+"""
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+def content_name(name, content):
+    """Имя по содержимому в каталоге name: <каталог>/ab/<sha256>.<ext>."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()
+    directory, filename = os.path.split(name)
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(directory, digest[:2], digest + ext)
+
+
+def lock(name):
+    """Блокирует имя файла до конца текущей транзакции.
+
+    В SQLite запись строки берёт замок записи всей базы, в остальных
+    базах строку блокирует SELECT ... FOR UPDATE.
+    """
+    media_file = apps.get_model('posts', 'MediaFile')
+    media_file.objects.bulk_create(
+        [media_file(name=name)], ignore_conflicts=True
+    )
+    list(media_file.objects.select_for_update().filter(name=name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def _save(self, name, content):
+        name = content_name(name, content)
+        # Снаружи транзакции поста замок держится только до записи файла.
+        with transaction.atomic():
+            lock(name)
+            if self.exists(name):
+                return name
+            return super()._save(name, content)
@@ -0,0 +1,93 @@
+"""Хештеги из текста постов.
+
+Теги из текста поста (#слово) приводятся к нижнему регистру и хранятся
+в таблице Tag, а связи PostTag повторяют дату публикации поста, поэтому
+лента тега — один диапазон индекса (tag, -pub_date, -post), как лента
+подписок. Связи обновляют сигналы при сохранении поста, а размеры лент
+тегов хранятся в счётчиках лент (см. posts.counters).
+"""
+import re
+
+from django.conf import settings
+
+from . import counters
+from .models import PostTag, Tag
+
+# Решётка внутри слова, ссылки (/#якорь) и HTML-сущности (&#39;) —
+# не тег.
+TAG_RE = re.compile(
+    rf'(?<![\w#&/])#(\w{{1,{settings.TAG_MAX_LENGTH}}})(?!\w)'
+)
+NAMES_CHUNK_SIZE = counters.KEYS_CHUNK_SIZE
+
+
+def normalize(name):
+    return name.casefold()
+
+
+def extract(text):
+    """Имена тегов текста в порядке появления, без повторов и чисел."""
+    names = {}
+    for match in TAG_RE.finditer(text):
+        name = normalize(match.group(1))
+        if not name.isdigit() and len(name) <= settings.TAG_MAX_LENGTH:
+            names.setdefault(name)
+    return list(names)
+
+
+def get_tag_ids(names):
+    """id тегов по именам; недостающие теги создаются."""
+    names = list(names)
+    tag_ids = {}
+    for start in range(0, len(names), NAMES_CHUNK_SIZE):
+        chunk = names[start:start + NAMES_CHUNK_SIZE]
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in chunk], ignore_conflicts=True
+        )
+        tag_ids.update(
+            Tag.objects.filter(name__in=chunk).values_list('name', 'pk')
+        )
+    return tag_ids
+
+
+def sync_post_tags(post):
+    """Приводит связи поста с тегами к тегам его текста."""
+    names = extract(post.text)
+    current = dict(
+        PostTag.objects.filter(post=post).values_list('tag__name', 'tag_id')
+    )
+    removed = [
+        tag_id for name, tag_id in current.items() if name not in names
+    ]
+    if removed:
+        PostTag.objects.filter(post=post, tag_id__in=removed).delete()
+        counters.change_feed_counts(
+            [counters.tag_key(tag_id) for tag_id in removed], -1
+        )
+    added = [name for name in names if name not in current]
+    if added:
+        tag_ids = get_tag_ids(added)
+        PostTag.objects.bulk_create(
+            PostTag(tag_id=tag_ids[name], post=post, pub_date=post.pub_date)
+            for name in added
+        )
+        counters.change_feed_counts(
+            [counters.tag_key(tag_ids[name]) for name in added], 1
+        )
+
+
+def link_posts(posts):
+    """Связи с тегами для пачки постов без учёта уже существующих.
+
+    Счётчики лент тегов не меняются. Возвращает число найденных связей.
+    """
+    post_names = [(post, extract(post.text)) for post in posts]
+    tag_ids = get_tag_ids({
+        name for _, names in post_names for name in names
+    })
+    links = [
+        PostTag(tag_id=tag_ids[name], post=post, pub_date=post.pub_date)
+        for post, names in post_names for name in names
+    ]
+    PostTag.objects.bulk_create(links, ignore_conflicts=True)
+    return len(links)
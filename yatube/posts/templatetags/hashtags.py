@@ -0,0 +1,33 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape, format_html
+from django.utils.safestring import mark_safe
+
+from ..tags import TAG_RE, extract
+
+register = template.Library()
+
+
+@register.filter
+def link_tags(text):
+    """Текст с хештегами-ссылками на ленты тегов.
+
+    Теги ищутся в исходном тексте, а экранируются куски между ними:
+    иначе &#тег после экранирования превращается в &amp;#тег и
+    становится ссылкой.
+    """
+    parts = []
+    end = 0
+    for match in TAG_RE.finditer(text):
+        names = extract(match.group())
+        if not names:
+            continue
+        parts.append(conditional_escape(text[end:match.start()]))
+        parts.append(format_html(
+            '<a href="{}">{}</a>',
+            reverse('posts:tag_list', args=[names[0]]),
+            match.group(),
+        ))
+        end = match.end()
+    parts.append(conditional_escape(text[end:]))
+    return mark_safe(''.join(parts))
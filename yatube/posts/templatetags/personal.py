@@ -0,0 +1,16 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..personal import is_shared_render, placeholder, render_fragment
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name, **kwargs):
+    """Фрагмент для текущего пользователя или метка под общий кеш."""
+    request = context['request']
+    kwargs = {key: str(value) for key, value in kwargs.items()}
+    if is_shared_render(request):
+        return mark_safe(placeholder(name, kwargs))
+    return mark_safe(render_fragment(request, name, kwargs))
@@ -0,0 +1,11 @@
+from django import template
+
+from ..cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, show_group=True):
+    """Карточки постов страницы из кеша фрагментов."""
+    return render_cards(list(posts), show_group)
@@ -1,8 +1,13 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.test import Client, RequestFactory, TestCase
 from django.urls import reverse
 
-from ..models import Post, User
+from .. import cards, etags, versions
+from ..cards import render_cards
+from ..models import Comment, Follow, Group, Post, User
 
 
 class CacheTests(TestCase):
@@ -19,23 +24,21 @@ class CacheTests(TestCase):
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def get_index(self):
+        return self.authorized_client.get(reverse('posts:index')).content
 
     def test_cache(self):
         """Кеширование на странице index работает корректно."""
-        start_content = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
-        self.post.delete()
-        content_after_delete_post = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
+        start_content = self.get_index()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        content_after_silent_update = self.get_index()
         cache.clear()
-        content_after_cache_clear = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
+        content_after_cache_clear = self.get_index()
         self.assertEqual(
             start_content,
-            content_after_delete_post,
+            content_after_silent_update,
             'Отсутствует кеширование страницы'
         )
         self.assertNotEqual(
@@ -43,3 +46,313 @@ class CacheTests(TestCase):
             content_after_cache_clear,
             'Кеширование страницы работает некорректно'
         )
+
+    def test_cache_invalidated_by_writes(self):
+        """Запись поста сразу сбрасывает кеш index."""
+        self.get_index()
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост сразу на главной'},
+        )
+        self.assertIn(
+            'Новый пост сразу на главной',
+            self.get_index().decode(),
+            'Новый пост не появился на закешированной главной'
+        )
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertNotIn(
+            'Пост для тестирования',
+            self.get_index().decode(),
+            'Удалённый пост остался на закешированной главной'
+        )
+
+    def test_cache_invalidated_by_author_name(self):
+        """Смена имени автора сбрасывает кеш index."""
+        self.get_index()
+        self.author.first_name = 'Переименованный'
+        self.author.save()
+        self.assertIn(
+            'Переименованный',
+            self.get_index().decode(),
+            'Новое имя автора не появилось на закешированной главной'
+        )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост для тестирования карточек',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def get_card(self):
+        return render_cards([Post.objects.get(pk=self.post.pk)])[0]
+
+    def test_cards_cached(self):
+        """Карточка поста отрисовывается один раз."""
+        cards.reset_stats()
+        self.get_card()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertIn(
+            'Пост для тестирования карточек',
+            self.get_card(),
+            'Карточка поста не берётся из кеша'
+        )
+        self.assertEqual(
+            cards.get_stats(),
+            (1, 1),
+            'Счётчики попаданий кеша карточек неверны'
+        )
+
+    def test_card_stats_flushed_rarely(self):
+        """Счётчики карточек пишутся в кеш не на каждую отрисовку."""
+        cards.reset_stats()
+        with mock.patch.object(cards, 'flush_stats') as flush_stats:
+            self.get_card()
+            self.get_card()
+        flush_stats.assert_not_called()
+        with mock.patch.object(cards, 'STATS_FLUSH_INTERVAL', 0):
+            self.get_card()
+        self.assertEqual(
+            cache.get_many([cards.HITS_KEY, cards.MISSES_KEY]),
+            {cards.HITS_KEY: 2, cards.MISSES_KEY: 1},
+        )
+
+    def test_cards_invalidated(self):
+        """Правка поста, группы и имени автора обновляет карточку."""
+        self.get_card()
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Изменённый текст', 'group': self.group.pk},
+        )
+        self.assertIn('Изменённый текст', self.get_card())
+        self.group.slug = 'new_slug'
+        self.group.save()
+        self.assertIn('/group/new_slug/', self.get_card())
+        self.author.first_name = 'Новое'
+        self.author.save()
+        self.assertIn('Новое', self.get_card())
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост для тестирования',
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.author}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def etags(self, client):
+        return [client.get(url)['ETag'] for url in self.urls]
+
+    def test_not_modified(self):
+        """Неизменная страница отдаётся ответом 304."""
+        for url, etag in zip(self.urls, self.etags(self.client)):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_etag_per_user(self):
+        """Страницы разных пользователей имеют разные ETag."""
+        guest = self.etags(self.client)
+        for url, etag, user_etag in zip(
+            self.urls, guest, self.etags(self.authorized_client)
+        ):
+            with self.subTest(url=url):
+                self.assertNotEqual(etag, user_etag)
+
+    def test_writes_change_etags(self):
+        """Новый пост, комментарий и подписка меняют ETag страниц."""
+        writes = (
+            lambda: Post.objects.create(
+                author=self.author, text='Новый пост', group=self.group
+            ),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.user, text='Комментарий'
+            ),
+            lambda: Follow.objects.create(user=self.user, author=self.author),
+        )
+        changed = (self.urls, self.urls[3:], self.urls[2:])
+        for write, urls in zip(writes, changed):
+            before = dict(zip(self.urls, self.etags(self.authorized_client)))
+            write()
+            for url in urls:
+                with self.subTest(url=url):
+                    response = self.authorized_client.get(
+                        url, HTTP_IF_NONE_MATCH=before[url]
+                    )
+                    self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        """Правка комментария и смена имени его автора меняют ETag поста."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        url = self.urls[3]
+
+        def rename_author():
+            self.user.username = 'Renamed'
+            self.user.save()
+
+        def edit_comment():
+            comment.text = 'Исправленный комментарий'
+            comment.save()
+
+        for write in (edit_comment, rename_author, comment.delete):
+            etag = self.client.get(url)['ETag']
+            write()
+            with self.subTest(write=write.__name__):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_etag_single_query(self):
+        """ETag поста читается одним запросом без агрегатов."""
+        request = RequestFactory().get(self.urls[3])
+        request.user = AnonymousUser()
+        with self.assertNumQueries(1):
+            etags.post_etag(request, self.post.pk)
+
+
+class FeedFragmentCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Другое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост в ленте группы',
+            group=cls.group,
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_group(self, group):
+        return self.client.get(
+            reverse('posts:group_list', kwargs={'slug': group.slug})
+        ).content.decode()
+
+    def get_profile(self, client):
+        return client.get(
+            reverse('posts:profile', kwargs={'username': self.author})
+        ).content.decode()
+
+    def test_feeds_cached(self):
+        """Ленты группы и профиля берутся из кеша."""
+        self.get_group(self.group)
+        self.get_profile(self.client)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertIn('Пост в ленте группы', self.get_group(self.group))
+        self.assertIn('Пост в ленте группы', self.get_profile(self.client))
+
+    def test_post_move_invalidates_both_groups(self):
+        """Перенос поста сбрасывает ленты обеих групп."""
+        self.get_group(self.group)
+        self.get_group(self.other_group)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Перенесённый пост', 'group': self.other_group.pk},
+        )
+        self.assertNotIn('Перенесённый пост', self.get_group(self.group))
+        self.assertIn('Перенесённый пост', self.get_group(self.other_group))
+        self.assertIn('Перенесённый пост', self.get_profile(self.client))
+
+    def test_unrelated_writes_keep_versions(self):
+        """Записи в чужие ленты не сбрасывают кеш группы и автора."""
+        names = [
+            versions.group_version(self.group.pk),
+            versions.author_version(self.author.pk),
+        ]
+        before = versions.get_versions(names)
+        Post.objects.create(
+            author=self.user, text='Чужой пост', group=self.other_group
+        )
+        self.assertEqual(versions.get_versions(names), before)
+
+    def test_follow_button_not_cached(self):
+        """Кнопка подписки зависит от зрителя, а не от кеша."""
+        self.assertIn('Отписаться', self.get_profile(self.authorized_client))
+        self.assertIn('Подписаться', self.get_profile(self.client))
+        self.assertNotIn('Отписаться', self.get_profile(self.client))
+
+
+class SharedPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='Author'),
+            text='Пост в общем кеше',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_index_shared_between_users(self):
+        """Главная кешируется одной копией для всех посетителей."""
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        content = self.authorized_client.get(
+            reverse('posts:index')
+        ).content.decode()
+        self.assertIn('Пост в общем кеше', content)
+        self.assertIn('Пользователь: HasNoName', content)
+        self.assertIn(reverse('posts:follow_index'), content)
+        self.assertNotIn('<!--personal:', content)
+        content = self.client.get(reverse('posts:index')).content.decode()
+        self.assertIn(reverse('users:login'), content)
+        self.assertNotIn('HasNoName', content)
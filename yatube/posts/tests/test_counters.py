@@ -0,0 +1,156 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters
+from ..models import FeedCounter, Follow, Group, Post, User, UserStats
+
+
+class FeedCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост для тестирования счётчиков',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.keys = {
+            counters.ALL_POSTS_KEY: Post.objects.all(),
+            counters.author_key(self.author.pk): self.author.posts.all(),
+            counters.group_key(self.group.pk): self.group.posts.all(),
+            counters.group_key(self.other_group.pk): (
+                self.other_group.posts.all()
+            ),
+            counters.follow_key(self.follower.pk): Post.objects.filter(
+                author__following__user=self.follower
+            ),
+        }
+        for key, queryset in self.keys.items():
+            counters.get_feed_count(key, queryset)
+
+    def assertCountersActual(self):
+        for key, queryset in self.keys.items():
+            with self.subTest(key=key):
+                self.assertEqual(
+                    FeedCounter.objects.get(key=key).value,
+                    queryset.count(),
+                    f'Счётчик {key} разошёлся с лентой'
+                )
+
+    def test_counters_follow_writes(self):
+        """Счётчики поддерживаются при создании, переносе и удалении."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertCountersActual()
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Новый пост',
+            group=self.group,
+        )
+        self.assertCountersActual()
+        new_post.group = self.other_group
+        new_post.save()
+        self.assertCountersActual()
+        new_post.delete()
+        self.assertCountersActual()
+        Follow.objects.all().delete()
+        self.assertCountersActual()
+
+    def test_paginator_reads_counter(self):
+        """Пагинатор берёт размер ленты из счётчика."""
+        FeedCounter.objects.filter(key=counters.ALL_POSTS_KEY).update(
+            value=100
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 100)
+
+    def test_reconcile_fixes_drift(self):
+        """Команда reconcile_feed_counts исправляет расхождения."""
+        FeedCounter.objects.update(value=100)
+        call_command('reconcile_feed_counts', stdout=StringIO())
+        self.assertCountersActual()
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='HasNoName')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(user=user, field=field):
+                self.assertEqual(
+                    getattr(stats, field),
+                    value,
+                    f'Поле {field} статистики пользователя неверно'
+                )
+
+    def test_stats_follow_views(self):
+        """Статистика пользователя обновляется из view."""
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'}
+        )
+        self.assertStats(self.author, post_count=1)
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}
+        ))
+        self.assertStats(self.author, follower_count=1)
+        self.assertStats(self.follower, following_count=1)
+        response = self.follower_client.get(reverse(
+            'posts:profile', kwargs={'username': self.author}
+        ))
+        self.assertContains(response, 'Всего постов: 1')
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}
+        ))
+        self.assertStats(self.author, follower_count=0)
+        self.assertStats(self.follower, following_count=0)
+        Post.objects.filter(author=self.author).get().delete()
+        self.assertStats(self.author, post_count=0)
+
+    def test_missing_stats_created(self):
+        """Отсутствующая статистика создаётся по таблицам при увеличении."""
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).delete()
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertStats(self.author, post_count=1, follower_count=1)
+
+    def test_reconcile_fixes_stats(self):
+        """Команда reconcile_feed_counts чинит и создаёт статистику."""
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.follower, author=self.author)
+        UserStats.objects.filter(user=self.author).update(
+            post_count=5, follower_count=0
+        )
+        UserStats.objects.filter(user=self.follower).delete()
+        call_command('reconcile_feed_counts', stdout=StringIO())
+        self.assertStats(self.author, post_count=1, follower_count=1)
+        self.assertStats(self.follower, post_count=0, following_count=1)
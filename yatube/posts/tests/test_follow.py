@@ -1,7 +1,17 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.transaction import atomic
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from ..models import Follow, Post, User
+from .. import counters
+from ..models import (
+    FeedCounter, Follow, PendingFanout, Post, TimelineEntry, User
+)
 
 
 class FollowTests(TestCase):
@@ -94,3 +104,196 @@ class FollowTests(TestCase):
             posts_for_not_follower,
             'Новый пост автора появляется в ленте не подписанного пользователя'
         )
+
+    def test_timeline_follows_writes(self):
+        """Лента подписок пополняется и чистится при записи."""
+        self.follower_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}
+        ))
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Новый пост от автора',
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(
+                user=self.follower
+            ).values_list('post_id', flat=True)),
+            [new_post.pk, self.post.pk],
+            'Посты автора не попадают в ленту подписчика'
+        )
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}
+        ))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists(),
+            'После отписки посты автора остаются в ленте'
+        )
+
+    def test_rebuild_timelines(self):
+        """Команда rebuild_timelines восстанавливает ленту подписок."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(
+            self.post,
+            response.context['page_obj'],
+            'Команда не восстановила ленту подписчика'
+        )
+
+    def test_drain_timeline_queue(self):
+        """Невыполненные фоновые записи в ленты выполняет команда."""
+        with self.settings(TIMELINE_FANOUT_ASYNC=True):
+            # В TestCase транзакция не фиксируется и фоновый поток не
+            # запускается — как при перезапуске до его работы.
+            Follow.objects.create(user=self.follower, author=self.author)
+            post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(PendingFanout.objects.count(), 2)
+        self.assertFalse(TimelineEntry.objects.exists())
+        call_command('drain_timeline_queue', stdout=StringIO())
+        self.assertFalse(PendingFanout.objects.exists())
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.follower
+            ).values_list('post_id', flat=True)),
+            {self.post.pk, post.pk},
+        )
+
+    def test_follow_index_keyset(self):
+        """Лента подписок листается курсором."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}')
+            for i in range(settings.POSTS_COUNT)
+        )
+        call_command('rebuild_timelines', stdout=StringIO())
+        url = reverse('posts:follow_index')
+        first_page = self.follower_client.get(url).context['page_obj']
+        second_page = self.follower_client.get(
+            url, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(second_page),
+            list(Post.objects.filter(author=self.author).order_by(
+                '-pub_date', '-pk'
+            )[settings.POSTS_COUNT:]),
+            'Курсор ленты подписок указывает не на те посты'
+        )
+
+    def test_follow_index_engines(self):
+        """Все движки ленты подписок отдают одинаковые страницы."""
+        other_author = User.objects.create_user(username='OtherAuthor')
+        for author in (self.author, other_author):
+            Follow.objects.create(user=self.follower, author=author)
+            for i in range(settings.POSTS_COUNT):
+                Post.objects.create(author=author, text=f'Пост {i}')
+        Follow.objects.create(user=self.not_follower, author=self.author)
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        url = reverse('posts:follow_index')
+        for engine in ('timeline', 'merge', 'hybrid', 'join'):
+            with self.subTest(engine=engine), self.settings(
+                FOLLOW_FEED_ENGINE=engine,
+                FOLLOW_FEED_RECENT_LIMIT=3,
+                FOLLOW_FEED_HYBRID_THRESHOLD=2,
+            ):
+                cache.clear()
+                pages = [self.follower_client.get(url).context['page_obj']]
+                while pages[-1].next_cursor:
+                    pages.append(self.follower_client.get(
+                        url, {'after': pages[-1].next_cursor}
+                    ).context['page_obj'])
+                self.assertEqual(
+                    [post for page in pages for post in page],
+                    expected,
+                    'Курсорные страницы ленты подписок неверны'
+                )
+                numbered_page = self.follower_client.get(
+                    url, {'page': 2}
+                ).context['page_obj']
+                if engine in ('merge', 'hybrid'):
+                    # Нумерованные страницы слияния не глубже
+                    # FOLLOW_FEED_RECENT_LIMIT, дальше — курсор.
+                    self.assertEqual(numbered_page.number, 1)
+                    self.assertTrue(numbered_page.next_cursor)
+                    numbered = expected[:settings.POSTS_COUNT]
+                else:
+                    numbered = expected[
+                        settings.POSTS_COUNT:2 * settings.POSTS_COUNT
+                    ]
+                self.assertEqual(
+                    list(numbered_page),
+                    numbered,
+                    'Нумерованная страница ленты подписок неверна'
+                )
+                previous_page = self.follower_client.get(
+                    url, {'before': pages[1].previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    list(previous_page),
+                    expected[:settings.POSTS_COUNT],
+                    'Курсор before ленты подписок неверен'
+                )
+
+    def test_hybrid_threshold_crossing(self):
+        """При пересечении порога ленты подписчиков переводятся целиком."""
+        with self.settings(
+            FOLLOW_FEED_ENGINE='hybrid', FOLLOW_FEED_HYBRID_THRESHOLD=2
+        ):
+            Follow.objects.create(user=self.follower, author=self.author)
+            self.assertTrue(TimelineEntry.objects.filter(
+                user=self.follower, author=self.author
+            ).exists())
+            follow = Follow.objects.create(
+                user=self.not_follower, author=self.author
+            )
+            self.assertFalse(
+                TimelineEntry.objects.filter(author=self.author).exists()
+            )
+            popular_post = Post.objects.create(
+                author=self.author, text='Пост популярного автора'
+            )
+            follow.delete()
+            self.assertEqual(
+                set(TimelineEntry.objects.filter(
+                    user=self.follower
+                ).values_list('post_id', flat=True)),
+                {self.post.pk, popular_post.pk},
+            )
+
+    def test_merge_follow_count_from_authors(self):
+        """Без 'timeline' размер ленты подписок — сумма постов авторов."""
+        url = reverse('posts:follow_index')
+        with self.settings(FOLLOW_FEED_ENGINE='merge'):
+            cache.clear()
+            Follow.objects.create(user=self.follower, author=self.author)
+            Post.objects.create(author=self.author, text='Новый пост')
+            self.assertFalse(FeedCounter.objects.filter(
+                key=counters.follow_key(self.follower.pk)
+            ).exists(), 'Пост не должен писать счётчики подписчиков')
+            page = self.follower_client.get(url).context['page_obj']
+            self.assertEqual(page.paginator.count, 2)
+            Post.objects.create(author=self.author, text='Ещё пост')
+            page = self.follower_client.get(url).context['page_obj']
+            self.assertEqual(
+                page.paginator.count, 2, 'Размер ленты должен кешироваться'
+            )
+            other_author = User.objects.create_user(username='OtherAuthor')
+            Post.objects.create(author=other_author, text='Пост другого')
+            Follow.objects.create(user=self.follower, author=other_author)
+            page = self.follower_client.get(url).context['page_obj']
+            self.assertEqual(
+                page.paginator.count, 4, 'Подписка должна сбрасывать кеш'
+            )
+
+    def test_follow_constraints(self):
+        """Повторная подписка и подписка на себя запрещены в базе."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        for user, author in (
+            (self.follower, self.author),
+            (self.author, self.author),
+        ):
+            with self.subTest(user=user, author=author):
+                with self.assertRaises(IntegrityError), atomic():
+                    Follow.objects.create(user=user, author=author)
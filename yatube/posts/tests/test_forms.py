@@ -1,3 +1,4 @@
+import io
 import shutil
 import tempfile
 
@@ -5,9 +6,12 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image, ImageCms
 
 from ..forms import PostForm
 from ..models import Comment, Post, User
+from ..storage import content_name
+from .utils import cmyk_profile
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -47,6 +51,16 @@ class PostFormTest(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
+    def assertStoredByContent(self, image):
+        """Картинка лежит в папке постов под SHA-256 содержимого."""
+        self.assertTrue(
+            image.name.startswith(self.posts_image_folder),
+            'Картинка к посту не добавлена'
+        )
+        with image.open('rb'):
+            expected = content_name(self.posts_image_folder + 'x.gif', image)
+        self.assertEqual(image.name, expected)
+
     def test_create_post(self):
         """Валидная форма создает запись в Post."""
         posts_count = Post.objects.count()
@@ -79,10 +93,11 @@ class PostFormTest(TestCase):
             Post.objects.filter(
                 author=self.user,
                 text=self.new_post_text,
-                image=self.posts_image_folder + uploaded.name
             ).exists(),
             'Созданный пост не найден в БД'
         )
+        post = Post.objects.get(text=self.new_post_text)
+        self.assertStoredByContent(post.image)
 
     def test_edit_post(self):
         """Валидная форма изменяет запись в Post."""
@@ -110,11 +125,7 @@ class PostFormTest(TestCase):
             self.change_post_text,
             'Текст поста не изменился'
         )
-        self.assertEqual(
-            self.post.image,
-            self.posts_image_folder + uploaded.name,
-            'Картинка к посту не добавлена'
-        )
+        self.assertStoredByContent(self.post.image)
 
     def test_add_comment_by_auth_client(self):
         """Валидная форма добавляет комментарий к посту."""
@@ -158,3 +169,96 @@ class PostFormTest(TestCase):
             with self.subTest(form=form):
                 help_text = self.form.fields[form].help_text
                 self.assertIsNotNone(help_text)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, size, exif=None, mode='RGB', color=(10, 120, 200),
+               icc_profile=None):
+        buffer = io.BytesIO()
+        image = Image.new(mode, size, color)
+        options = {'exif': exif} if exif is not None else {}
+        if icc_profile is not None:
+            options['icc_profile'] = icc_profile
+        image.save(buffer, 'JPEG', **options)
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с фото', 'image': SimpleUploadedFile(
+                'photo.jpg', buffer.getvalue(), 'image/jpeg'
+            )},
+        )
+
+    def saved_image(self):
+        post = Post.objects.get(text='Пост с фото')
+        with post.image.open() as file, Image.open(file) as image:
+            image.load()
+            return image
+
+    def test_exif_orientation_applied_and_stripped(self):
+        """Картинка поворачивается по EXIF, метаданные удаляются."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Производитель камеры'
+        self.upload((200, 100), exif.tobytes())
+        image = self.saved_image()
+        self.assertEqual(image.size, (100, 200))
+        self.assertEqual(dict(image.getexif()), {})
+
+    def test_cmyk_converted_by_profile(self):
+        """CMYK переводится в sRGB по профилю, сам профиль не остаётся."""
+        self.upload(
+            (50, 50), mode='CMYK', color=(0, 0, 0, 128),
+            icc_profile=cmyk_profile(),
+        )
+        image = self.saved_image()
+        self.assertEqual(image.mode, 'RGB')
+        self.assertIsNone(image.info.get('icc_profile'))
+        red, green, _ = image.getpixel((25, 25))
+        self.assertGreater(red - green, 100, 'Профиль не применён')
+
+    def test_profile_kept_and_bad_profile_ignored(self):
+        """Профиль RGB сохраняется, чужой профиль CMYK не ломает загрузку."""
+        srgb = ImageCms.ImageCmsProfile(
+            ImageCms.createProfile('sRGB')
+        ).tobytes()
+        self.upload((50, 50), icc_profile=srgb)
+        self.assertEqual(self.saved_image().info.get('icc_profile'), srgb)
+        Post.objects.all().delete()
+        self.upload(
+            (50, 50), mode='CMYK', color=(0, 0, 0, 128), icc_profile=srgb
+        )
+        image = self.saved_image()
+        self.assertEqual(image.mode, 'RGB')
+        self.assertIsNone(image.info.get('icc_profile'))
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_large_image_downscaled(self):
+        """Оригинал уменьшается до наибольшего размера."""
+        self.upload((400, 200))
+        self.assertEqual(self.saved_image().size, (100, 50))
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        """Картинка со слишком большим числом пикселей отклоняется."""
+        response = self.upload((50, 50))
+        self.assertFormError(
+            response,
+            'form',
+            'image',
+            'Картинка слишком большая: 50×50 пикселей.',
+        )
+        self.assertFalse(Post.objects.filter(text='Пост с фото').exists())
@@ -1,10 +1,14 @@
 import math
 
 from django.conf import settings
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import Client, SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Group, Post, User
+from ..utils import page_window
 
 GROUP_POST_COUNT = 12
 PROFILE_POST_COUNT = 13
@@ -43,6 +47,7 @@ class PaginatorTests(TestCase):
 
     def setUp(self):
         self.client = Client()
+        cache.clear()
 
     def test_paginator_returns(self):
         """Пагинатор возвращает правильное количество постов."""
@@ -69,3 +74,96 @@ class PaginatorTests(TestCase):
                             'Пагинатор возвращает не верное количество постов'
                         )
                     page += 1
+
+    def test_keyset_paginator_walks_all_posts(self):
+        """Курсорный пагинатор проходит ленту без пропусков и повторов."""
+        for url, url_posts_count in self.paginator_urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                seen = list(response.context['page_obj'])
+                cursor = response.context['page_obj'].next_cursor
+                while cursor:
+                    page_obj = self.client.get(
+                        url, {'after': cursor}
+                    ).context['page_obj']
+                    self.assertIsNone(
+                        page_obj.number,
+                        'Курсорная страница не должна знать свой номер'
+                    )
+                    seen.extend(page_obj)
+                    cursor = page_obj.next_cursor
+                self.assertEqual(
+                    len(seen),
+                    url_posts_count,
+                    'Курсорный пагинатор теряет посты'
+                )
+                self.assertEqual(
+                    len(set(post.pk for post in seen)),
+                    url_posts_count,
+                    'Курсорный пагинатор повторяет посты'
+                )
+
+    def test_keyset_paginator_before(self):
+        """Курсор before возвращает предыдущую страницу."""
+        url = reverse('posts:index')
+        first_page = list(self.client.get(url).context['page_obj'])
+        second_page = self.client.get(
+            url + '?page=2'
+        ).context['page_obj']
+        previous_page = self.client.get(
+            url, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(previous_page),
+            first_page,
+            'Курсор before возвращает неверную страницу'
+        )
+        self.assertFalse(previous_page.has_previous())
+
+    def test_keyset_paginator_broken_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'after': 'broken'}
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+
+class PageWindowTests(SimpleTestCase):
+    def page(self, number, num_pages=30000):
+        return Paginator(range(num_pages), 1).page(number)
+
+    def test_page_window(self):
+        """Окно страниц: соседние с текущей, крайние и пропуски."""
+        cases = (
+            (1, 30000, [1, 2, 3, None, 30000]),
+            (4, 30000, [1, 2, 3, 4, 5, 6, None, 30000]),
+            (15000, 30000, [1, None, 14998, 14999, 15000, 15001, 15002,
+                            None, 30000]),
+            (30000, 30000, [1, None, 29998, 29999, 30000]),
+            (2, 3, [1, 2, 3]),
+            (1, 1, [1]),
+        )
+        for number, num_pages, expected in cases:
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(
+                    page_window(self.page(number, num_pages)), expected
+                )
+
+    @override_settings(PAGE_WINDOW=1)
+    def test_page_window_setting(self):
+        """Ширина окна читается из PAGE_WINDOW при каждом вызове."""
+        self.assertEqual(
+            page_window(self.page(15000)),
+            [1, None, 14999, 15000, 15001, None, 30000],
+        )
+
+    def test_navigation_size_constant(self):
+        """Навигация не растёт вместе с числом страниц."""
+        page = self.page(15000)
+        page.page_window = page_window(page)
+        html = render_to_string(
+            'includes/paginator.html', {'page_obj': page}
+        )
+        self.assertEqual(html.count('class="page-item'), 13)
+        self.assertIn('?page=30000', html)
+        self.assertIn('&hellip;', html)
@@ -0,0 +1,114 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+FEED_AUTHORS_COUNT = 5
+FEED_POSTS_COUNT = 15
+
+
+class QueryBudgetTests(TestCase):
+    """Предельное число SQL-запросов на страницу.
+
+    Бюджет не зависит от числа постов на странице: рост числа
+    запросов означает N+1 в ленте и должен ронять тесты.
+    """
+    # Запросы сессии и пользователя авторизованного клиента.
+    AUTH_QUERIES = 2
+    # Включая запрос для ETag (см. posts.etags).
+    QUERY_BUDGETS = {
+        'posts:index': 2,
+        'posts:group_list': 4,
+        'posts:profile': 5,
+        'posts:post_detail': 3,
+        'posts:follow_index': 2,
+    }
+    NOT_MODIFIED_BUDGET = 1
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        authors = [
+            User.objects.create_user(
+                username=f'Author{i}',
+                first_name=f'Имя{i}',
+                last_name=f'Фамилия{i}',
+            ) for i in range(FEED_AUTHORS_COUNT)
+        ]
+        for i in range(FEED_POSTS_COUNT):
+            cls.post = Post.objects.create(
+                author=authors[i % FEED_AUTHORS_COUNT],
+                text=f'Тестовый пост {i}',
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post,
+                author=authors[(i + 1) % FEED_AUTHORS_COUNT],
+                text=f'Комментарий {i}',
+            )
+        for author in authors:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'slug': cls.group.slug}
+            ),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': authors[0].username}
+            ),
+            'posts:post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': cls.post.pk}
+            ),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def assertMaxQueries(self, budget, url):
+        # Первый запрос прогревает счётчики лент.
+        self.authorized_client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(url)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context),
+            budget,
+            f'{url} превысил бюджет запросов:\n{queries}'
+        )
+
+    def test_views_fit_query_budget(self):
+        """Страницы укладываются в бюджет SQL-запросов."""
+        for view_name, budget in self.QUERY_BUDGETS.items():
+            with self.subTest(view=view_name):
+                self.assertMaxQueries(
+                    budget + self.AUTH_QUERIES, self.urls[view_name]
+                )
+
+    def test_not_modified_fits_query_budget(self):
+        """Ответ 304 стоит не больше одного запроса кроме авторизации."""
+        for view_name in ('posts:index', 'posts:group_list', 'posts:profile',
+                          'posts:post_detail'):
+            with self.subTest(view=view_name):
+                url = self.urls[view_name]
+                etag = self.authorized_client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as context:
+                    response = self.authorized_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertLessEqual(
+                    len(context), self.NOT_MODIFIED_BUDGET + self.AUTH_QUERIES
+                )
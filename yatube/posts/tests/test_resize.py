@@ -0,0 +1,165 @@
+import io
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from .. import resize
+from ..models import Post, User
+from .utils import jpeg_file
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResizeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.image_name = default_storage.save(
+            'posts/source.jpg', jpeg_file('source.jpg', (1200, 900))
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get_image(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with Image.open(io.BytesIO(b''.join(response))) as image:
+            return response, image.format, image.size
+
+    def test_signed_transform(self):
+        """Ссылка задаёт размер, обрезку и формат результата."""
+        cases = (
+            ((300, 100, True, 'webp'), ('WEBP', (300, 100))),
+            ((300, None, False, 'jpg'), ('JPEG', (300, 225))),
+            ((400, 400, False, 'jpg'), ('JPEG', (400, 300))),
+        )
+        for args, expected in cases:
+            with self.subTest(args=args):
+                response, *result = self.get_image(
+                    resize.resize_url(self.image_name, *args)
+                )
+                self.assertEqual(tuple(result), expected)
+                self.assertIn('immutable', response['Cache-Control'])
+
+    def test_bad_signature(self):
+        """Изменённая ссылка и ссылка на несуществующую картинку — 404."""
+        url = resize.resize_url(self.image_name, 300)
+        self.assertEqual(
+            self.client.get(url.replace('/img/', '/img/x')).status_code, 404
+        )
+        missing = resize.resize_url('posts/missing.jpg', 300)
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_srcsets_skip_upscaling(self):
+        """srcset по ссылкам не содержит ширин больше исходной."""
+        fallback = resize.srcsets(self.image_name, 1200)['fallback']
+        self.assertIn(' 960w', fallback)
+        self.assertNotIn(' 1440w', fallback)
+        self.assertIn(
+            ' 1440w', resize.srcsets(self.image_name, 1600)['fallback']
+        )
+
+    def test_srcsets_use_stored_width(self):
+        """Ширина картинки хранится в посте, srcset не читает файл."""
+        user = User.objects.create_user(username='HasNoName')
+        post = Post.objects.create(
+            author=user, text='Пост',
+            image=jpeg_file('stored.jpg', (1600, 1200), (10, 10, 200)),
+        )
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.image_width, 1600)
+        with mock.patch.object(Image, 'open') as image_open:
+            fallback = post.image_srcsets['fallback']
+        image_open.assert_not_called()
+        self.assertIn(' 1440w', fallback)
+
+    def test_disk_cache(self):
+        """Повторный запрос отдаёт готовый файл без уменьшения."""
+        url = resize.resize_url(self.image_name, 200, 200, True)
+        with mock.patch.object(
+            resize, 'make_resized', wraps=resize.make_resized
+        ) as make_resized:
+            self.get_image(url)
+            self.get_image(url)
+        self.assertEqual(make_resized.call_count, 1)
+
+    def test_duplicate_requests_collapsed(self):
+        """Одновременные одинаковые запросы уменьшают картинку один раз."""
+        token = resize.resize_url(self.image_name, 250).split('/')[-2]
+        calls = []
+        make_resized = resize.make_resized
+
+        def slow_resize(*args):
+            calls.append(args)
+            time.sleep(0.2)
+            make_resized(*args)
+
+        results = []
+        with mock.patch.object(resize, 'make_resized', slow_resize):
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(resize.get_resized(token))
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len({name for name, _ in results}), 1)
+
+    def test_waiters_get_leader_error(self):
+        """Ждавшие получают ошибку уменьшения, а не ответ «занято»."""
+        token = resize.resize_url('posts/missing.jpg', 250).split('/')[-2]
+        make_resized = resize.make_resized
+
+        def slow_resize(*args):
+            time.sleep(0.2)
+            make_resized(*args)
+
+        errors = []
+
+        def request():
+            try:
+                resize.get_resized(token)
+            except Exception as error:
+                errors.append(error)
+
+        with mock.patch.object(resize, 'make_resized', slow_resize):
+            threads = [threading.Thread(target=request) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(errors), 3)
+        for error in errors:
+            self.assertIsInstance(error, OSError)
+
+    @override_settings(IMAGE_RESIZE_WAIT=0)
+    def test_busy(self):
+        """Без свободных мест уменьшения ответ 503 с Retry-After."""
+        slots = resize.get_slots()
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            response = self.client.get(
+                resize.resize_url(self.image_name, 123)
+            )
+        finally:
+            for _ in range(taken):
+                slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '0')
@@ -0,0 +1,111 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='HasNoName', is_staff=True, is_superuser=True
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Поход в горы: палатка и <b>котелок</b>'
+        )
+        cls.other = Post.objects.create(author=cls.user, text='Про море')
+        cls.comment = Comment.objects.create(
+            post=cls.other, author=cls.user, text='Лучше в горы, чем на море'
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def texts(self, query, **kwargs):
+        results, _ = search.search(query, **kwargs)
+        return [
+            (result.comment or result.post).text for result in results
+        ]
+
+    def test_finds_posts_and_comments(self):
+        """Посты и комментарии ищутся по префиксу отдельно."""
+        self.assertEqual(self.texts('гор'), [self.post.text])
+        self.assertEqual(
+            self.texts('гор', kind=search.COMMENT), [self.comment.text]
+        )
+        self.assertEqual(self.texts('палатка котел'), [self.post.text])
+        self.assertEqual(self.texts('" OR *'), [])
+
+    def test_short_terms_match_whole_words(self):
+        """Слова короче MIN_PREFIX_LENGTH не ищутся как префиксы."""
+        self.assertEqual(search.match_query('в горы'), '"в" "горы"*')
+        self.assertEqual(self.texts('по'), [])
+        self.assertEqual(self.texts('в'), [self.post.text])
+
+    def test_index_follows_changes(self):
+        """Изменение и удаление поста сразу видны в поиске."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Поход к озеру'
+        post.save()
+        self.assertEqual(self.texts('палатка'), [])
+        self.assertEqual(self.texts('озеру'), [post.text])
+        Comment.objects.get(pk=self.comment.pk).delete()
+        self.assertEqual(self.texts('горы'), [])
+
+    def test_snippet_highlight_is_escaped(self):
+        """Совпадения выделены, а разметка из текста экранирована."""
+        results, _ = search.search('котелок')
+        self.assertIn('<mark>котелок</mark>', results[0].snippet)
+        self.assertIn('&lt;b&gt;', results[0].snippet)
+
+    @override_settings(SEARCH_RESULTS_COUNT=1)
+    def test_keyset_pages(self):
+        """Курсор выдаёт следующие результаты без повторов."""
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Горы высокие'
+        )
+        url = reverse('posts:search')
+        params = {'q': 'горы', 'in': search.COMMENT}
+        response = self.client.get(url, params)
+        self.assertEqual(len(response.context['results']), 1)
+        next_cursor = response.context['next_cursor']
+        self.assertIsNotNone(next_cursor)
+        response = self.client.get(url, {**params, 'after': next_cursor})
+        second = response.context['results']
+        self.assertEqual(len(second), 1)
+        self.assertEqual(second[0].kind, search.COMMENT)
+        self.assertIsNone(response.context['next_cursor'])
+        first, _ = search.search('горы', search.COMMENT)
+        self.assertNotEqual(first[0].pk, second[0].pk)
+        response = self.client.get(url, {'q': 'горы', 'in': 'unknown'})
+        self.assertEqual(response.context['kind'], search.POST)
+
+    def test_admin_uses_index(self):
+        """Поиск в админке фильтрует по индексу, а не LIKE."""
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'палатка'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post]
+        )
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'море'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.comment]
+        )
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает индекс после изменений в обход сигналов."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.POST_INDEX}')
+        self.assertEqual(self.texts('палатка'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.texts('палатка'), [self.post.text])
@@ -0,0 +1,133 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.test import TransactionTestCase, override_settings
+
+from .. import thumbnails
+from ..models import MediaFile, Post, User
+from .utils import jpeg_file
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
+class ContentAddressedStorageTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='HasNoName')
+
+    def create_post(self, name, size=(1200, 900)):
+        return Post.objects.create(
+            author=self.user, text='Пост', image=jpeg_file(name, size)
+        )
+
+    def test_same_content_same_file(self):
+        """Одинаковые загрузки хранятся одним файлом с общими вариантами."""
+        first = self.create_post('first.jpg')
+        second = self.create_post('second.JPG')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/\w\w/[0-9a-f]{64}\.jpg$')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(first.image_variants)
+        self.assertEqual(second.image_variants, first.image_variants)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))), 1)
+
+    def test_file_deleted_with_last_post(self):
+        """Файл и варианты удаляются вместе с последним постом."""
+        first = self.create_post('first.jpg')
+        second = self.create_post('second.jpg')
+        first.refresh_from_db()
+        name, thumbnail = first.image.name, first.thumbnail
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(thumbnail))
+        self.assertTrue(MediaFile.objects.filter(name=name).exists())
+        second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumbnail))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_release_keeps_file_reused_meanwhile(self):
+        """Файл, снова загруженный до удаления, остаётся у нового поста."""
+        first = self.create_post('first.jpg')
+        name = first.image.name
+        with transaction.atomic():
+            first.delete()
+            second = self.create_post('second.jpg')
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_replaced_image_released(self):
+        """Заменённая картинка без других ссылок удаляется."""
+        post = self.create_post('first.jpg')
+        old_name = post.image.name
+        post.image = jpeg_file('second.jpg', (800, 600))
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    def test_dedupe_media(self):
+        """Команда переводит старые файлы на имена по содержимому."""
+        content = jpeg_file('old.jpg', (800, 600)).read()
+        for name in ('posts/old.jpg', 'posts/copy.jpg'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(content)
+        old = Post.objects.create(author=self.user, text='Старый пост')
+        Post.objects.filter(pk=old.pk).update(
+            image='posts/old.jpg', thumbnail='thumbs/old/960.jpg',
+        )
+        copy = Post.objects.create(author=self.user, text='Копия')
+        Post.objects.filter(pk=copy.pk).update(image='posts/copy.jpg')
+        output = io.StringIO()
+        call_command('dedupe_media', stdout=output)
+        self.assertIn('Переименовано: 1, удалено копий: 1', output.getvalue())
+        old.refresh_from_db()
+        copy.refresh_from_db()
+        self.assertEqual(old.image.name, copy.image.name)
+        self.assertRegex(old.image.name, r'^posts/\w\w/[0-9a-f]{64}\.jpg$')
+        self.assertFalse(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, 'posts/old.jpg')
+        ))
+        self.assertEqual(
+            old.thumbnail,
+            f'{thumbnails.variant_prefix(old.image.name)}/960.jpg',
+        )
+
+    def test_dedupe_media_rerun_after_failure(self):
+        """После сбоя переноса файла повторный запуск доделывает работу."""
+        path = os.path.join(TEMP_MEDIA_ROOT, 'posts/lost.jpg')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(jpeg_file('lost.jpg', (640, 480)).read())
+        post = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.filter(pk=post.pk).update(image='posts/lost.jpg')
+        relink = mock.patch(
+            'posts.management.commands.dedupe_media.Command.relink',
+            side_effect=DatabaseError,
+        )
+        with relink, self.assertRaises(DatabaseError):
+            call_command('dedupe_media', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+        with mock.patch('os.replace', side_effect=OSError):
+            with self.assertRaises(OSError):
+                call_command('dedupe_media', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+        call_command('dedupe_media', stdout=io.StringIO())
+        post.refresh_from_db()
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(default_storage.exists(post.image.name))
+        self.assertTrue(default_storage.exists(post.thumbnail))
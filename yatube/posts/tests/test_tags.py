@@ -0,0 +1,110 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters, tags
+from ..templatetags.hashtags import link_tags
+from ..models import FeedCounter, Post, PostTag, Tag, User
+
+
+class TagTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def tag_count(self, name):
+        tag = Tag.objects.get(name=name)
+        return counters.get_feed_count(
+            counters.tag_key(tag.pk), tag.links.all()
+        )
+
+    def test_extract(self):
+        """Теги приводятся к нижнему регистру, ссылки и числа — не теги."""
+        self.assertEqual(
+            tags.extract(
+                'Про #Django и #django, #питон_3 на site.ru/#anchor, '
+                'в&#39;лоб, пункт #2 и a#b'
+            ),
+            ['django', 'питон_3'],
+        )
+
+    def test_link_tags(self):
+        """Ссылками становятся только теги исходного текста."""
+        url = reverse('posts:tag_list', args=['кино'])
+        self.assertEqual(
+            link_tags('<b>#Кино</b> &#кино #2'),
+            f'&lt;b&gt;<a href="{url}">#Кино</a>&lt;/b&gt; &amp;#кино #2',
+        )
+
+    def test_tags_follow_create_and_edit(self):
+        """Теги поста обновляются при создании и правке."""
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый #пост про #Кино'}
+        )
+        post = Post.objects.get()
+        self.assertCountEqual(
+            post.tag_links.values_list('tag__name', flat=True),
+            ['пост', 'кино'],
+        )
+        self.assertEqual(self.tag_count('кино'), 1)
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Пост про #музыку и #кино'},
+        )
+        self.assertCountEqual(
+            post.tag_links.values_list('tag__name', flat=True),
+            ['музыку', 'кино'],
+        )
+        self.assertEqual(self.tag_count('пост'), 0)
+        self.assertEqual(self.tag_count('кино'), 1)
+        post.delete()
+        self.assertEqual(self.tag_count('кино'), 0)
+
+    def test_tag_page(self):
+        """Лента тега листается курсором и содержит только его посты."""
+        total = settings.POSTS_COUNT + 1
+        for i in range(total):
+            Post.objects.create(author=self.user, text=f'Пост {i} #лента')
+        Post.objects.create(author=self.user, text='Без тега')
+        response = self.client.get(
+            reverse('posts:tag_list', args=['Лента'])
+        )
+        self.assertEqual(response.context['post_count'], total)
+        self.assertContains(response, '<a href="{}">#лента</a>'.format(
+            reverse('posts:tag_list', args=['лента'])
+        ))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), settings.POSTS_COUNT)
+        self.assertEqual(page[0].text, f'Пост {total - 1} #лента')
+        response = self.client.get(
+            reverse('posts:tag_list', args=['лента']),
+            {'after': page.next_cursor},
+        )
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Пост 0 #лента'],
+        )
+        response = self.client.get(reverse('posts:tag_list', args=['нет']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_backfill_command(self):
+        """Команда связывает старые посты с тегами и сбрасывает счётчики."""
+        for i in range(3):
+            Post.objects.create(author=self.user, text=f'#старый пост {i}')
+        PostTag.objects.all().delete()
+        FeedCounter.objects.create(
+            key=counters.tag_key(Tag.objects.get(name='старый').pk), value=0
+        )
+        call_command('backfill_tags', chunk_size=2, stdout=StringIO())
+        self.assertEqual(PostTag.objects.count(), 3)
+        self.assertEqual(self.tag_count('старый'), 3)
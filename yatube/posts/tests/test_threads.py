@@ -0,0 +1,121 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import threads
+from ..models import Comment, Post, User
+
+
+@override_settings(
+    COMMENTS_COUNT=2, COMMENT_MAX_DEPTH=2, COMMENT_REPLIES_PREVIEW=2
+)
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text=text, parent=parent
+        )
+
+    def test_paths_order_threads(self):
+        """Новые ветки идут первыми, ответы — сразу после родителя."""
+        first = self.comment('Первая ветка')
+        reply = self.comment('Ответ', first)
+        second = self.comment('Вторая ветка')
+        nested = self.comment('Ответ на ответ', reply)
+        later = self.comment('Поздний ответ', first)
+        self.assertEqual(
+            [c.text for c in threads.thread_queryset(self.post.pk)],
+            [
+                second.text, first.text, reply.text, nested.text, later.text,
+            ],
+        )
+        nested.refresh_from_db()
+        self.assertEqual(nested.depth, 2)
+        self.assertTrue(nested.path.startswith(first.path))
+        self.assertEqual(nested.thread_index, 2)
+
+    def test_depth_limit(self):
+        """Ответ на комментарий предельной глубины встаёт рядом с ним."""
+        root = self.comment('Ветка')
+        reply = self.comment('Ответ', root)
+        deepest = self.comment('Предельный', reply)
+        too_deep = self.comment('Глубже', deepest)
+        self.assertEqual(too_deep.depth, 2)
+        self.assertEqual(too_deep.parent_id, reply.pk)
+
+    def test_parent_from_other_post(self):
+        """Ответ на комментарий другого поста становится новой веткой."""
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        other = Comment.objects.create(
+            post=other_post, author=self.user, text='Чужой'
+        )
+        comment = self.comment('Ответ не туда', other)
+        comment.refresh_from_db()
+        self.assertIsNone(comment.parent_id)
+        self.assertEqual(comment.depth, 0)
+
+    def test_subtree_in_one_query(self):
+        """Ветка целиком приходит одним запросом и без чужих веток."""
+        root = self.comment('Ветка')
+        reply = self.comment('Ответ', root)
+        self.comment('Ответ на ответ', reply)
+        self.comment('Другая ветка')
+        with self.assertNumQueries(1):
+            texts = [
+                c.text for c in threads.subtree(self.post.pk, reply.pk)
+            ]
+        self.assertEqual(texts, ['Ответ', 'Ответ на ответ'])
+
+    def test_thread_page_with_previews(self):
+        """Страница — корни с первыми ответами одним запросом."""
+        roots = [self.comment(f'Ветка {i}') for i in range(3)]
+        for i in range(3):
+            self.comment(f'Ответ {i}', roots[2])
+        with self.assertNumQueries(1):
+            comments, next_start = threads.thread_page(self.post.pk)
+        self.assertEqual(
+            [c.text for c in comments],
+            ['Ветка 2', 'Ответ 0', 'Ответ 1', 'Ветка 1'],
+        )
+        self.assertEqual(comments[0].hidden_replies, 1)
+        self.assertEqual(
+            list(Comment.objects.filter(in_preview=False).values_list(
+                'text', flat=True
+            )),
+            ['Ответ 2'],
+        )
+        comments, next_start = threads.thread_page(self.post.pk, next_start)
+        self.assertEqual([c.text for c in comments], ['Ветка 0'])
+        self.assertIsNone(next_start)
+
+    def test_reply_form_and_thread_view(self):
+        """Ответ из формы попадает в ветку, ветка открывается целиком."""
+        root = self.comment('Ветка')
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Ответ из формы', 'parent': root.pk},
+        )
+        reply = Comment.objects.get(text='Ответ из формы')
+        self.assertEqual(reply.parent, root)
+        response = self.client.get(
+            reverse('posts:comment_thread', args=[self.post.pk, root.pk]),
+            {'format': 'json'},
+        )
+        self.assertEqual(
+            [c['text'] for c in response.json()['comments']],
+            ['Ветка', 'Ответ из формы'],
+        )
+        response = self.client.get(
+            reverse('posts:comment_thread', args=[self.post.pk, 0])
+        )
+        self.assertEqual(response.status_code, 404)
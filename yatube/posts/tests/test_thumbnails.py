@@ -0,0 +1,161 @@
+import io
+import json
+import shutil
+import tempfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import thumbnails
+from ..models import Post, User
+from .utils import jpeg_file
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def feed_thumbnail(post):
+    return f'{thumbnails.variant_prefix(post.image.name)}/960.jpg'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, name, color=(200, 30, 30)):
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': jpeg_file(
+                name, (1600, 1200), color
+            )},
+        )
+        return Post.objects.get(text='Пост с картинкой')
+
+    def test_resize_urls_until_generated(self):
+        """До генерации вариантов картинка отдаётся по ссылкам уменьшения."""
+        post = self.create_post('queued.jpg', (30, 200, 30))
+        name = feed_thumbnail(post)
+        self.assertFalse(default_storage.exists(name))
+        content = self.client.get(reverse('posts:index')).content.decode()
+        self.assertNotIn(name, content)
+        self.assertIn('width="960" height="339"', content)
+        src = post.image_srcsets['src']
+        self.assertIn(src, content)
+        response = self.client.get(src)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        with Image.open(io.BytesIO(b''.join(response))) as image:
+            self.assertEqual(image.size, (960, 339))
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_thumbnail_generated_on_save(self):
+        """Сохранение поста создаёт миниатюры всех размеров шаблонов."""
+        post = self.create_post('ready.jpg')
+        name = feed_thumbnail(post)
+        self.assertEqual(
+            (post.thumbnail, post.thumbnail_width, post.thumbnail_height),
+            (name, 960, 339),
+        )
+        with default_storage.open(name) as file, Image.open(file) as image:
+            self.assertEqual(image.size, (960, 339))
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ):
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                self.assertIn(default_storage.url(name), content)
+                self.assertIn('width="960" height="339"', content)
+                self.assertIn('loading="lazy"', content)
+                self.assertIn('<source type="image/webp"', content)
+                self.assertIn(
+                    default_storage.url(name.replace('960.jpg', '480.webp'))
+                    + ' 480w',
+                    content,
+                )
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_variants(self):
+        """Варианты не шире оригинала, кроме ширины ленты."""
+        post = self.create_post('wide.jpg')
+        variants = {
+            (ext, width, height)
+            for ext, width, height, _ in json.loads(post.image_variants)
+        }
+        for image_format in thumbnails.FORMATS:
+            for width, height in ((480, 170), (960, 339), (1440, 508)):
+                self.assertIn((image_format.ext, width, height), variants)
+        self.assertEqual(thumbnails.variant_widths(300), [480, 960])
+        output = io.StringIO()
+        call_command('image_savings_report', stdout=output)
+        self.assertIn('Картинок: 1', output.getvalue())
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_new_image_replaces_thumbnail(self):
+        """Новая картинка сбрасывает миниатюру старой."""
+        post = self.create_post('first.jpg')
+        old_thumbnail = post.thumbnail
+        with override_settings(THUMBNAIL_ASYNC=True):
+            self.authorized_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+                data={'text': 'Пост с картинкой', 'image': jpeg_file(
+                    'second.jpg', (800, 600)
+                )},
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, '')
+        self.assertIsNone(post.thumbnail_width)
+        call_command('generate_thumbnails', stdout=io.StringIO())
+        post.refresh_from_db()
+        self.assertNotEqual(post.thumbnail, old_thumbnail)
+        self.assertEqual(
+            post.thumbnail,
+            feed_thumbnail(post),
+        )
+        self.assertTrue(default_storage.exists(post.thumbnail))
+
+    def test_draft_size(self):
+        """Большой JPEG декодируется с уменьшением, но не меньше миниатюры."""
+        self.assertEqual(
+            thumbnails.draft_size((4000, 3000), (960, 339)), (960, 720)
+        )
+        self.assertEqual(
+            thumbnails.draft_size((1000, 200), (960, 339)), (1695, 339)
+        )
+
+    def test_broken_pool_recreated(self):
+        """Сломанный пул пересоздаётся, ошибка генерации пишется в лог."""
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        future = Future()
+        fresh = mock.Mock()
+        fresh.submit.return_value = future
+        on_ready = mock.Mock()
+        pool = mock.patch.object(
+            thumbnails, 'ProcessPoolExecutor', return_value=fresh
+        )
+        with mock.patch.object(thumbnails, '_executor', broken), pool:
+            thumbnails.submit('posts/broken.jpg', on_ready)
+            self.assertIs(thumbnails._executor, fresh)
+        broken.shutdown.assert_called_once_with(wait=False)
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            future.set_exception(OSError('нет файла'))
+        on_ready.assert_not_called()
@@ -9,7 +9,7 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..forms import PostForm
-from ..models import Group, Post, User
+from ..models import Comment, Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -231,3 +231,76 @@ class PostPagesTests(TestCase):
                     posts,
                     f'Новый пост не появился на {url}'
                 )
+
+
+@override_settings(COMMENTS_COUNT=3)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for i in range(7):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comment_count(self):
+        """Число комментариев хранится в посте."""
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 7)
+        Comment.objects.filter(text='Комментарий 0').delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 6)
+
+    def test_comments_loaded_in_batches(self):
+        """Страница поста показывает первую порцию, остальные подгружаются."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertContains(response, 'Комментарии: 7')
+        self.assertEqual(
+            [c.text for c in response.context['comments']],
+            ['Комментарий 6', 'Комментарий 5', 'Комментарий 4'],
+        )
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        texts = []
+        params = {'format': 'json'}
+        while True:
+            with self.assertNumQueries(1):
+                data = self.client.get(url, params).json()
+            texts += [comment['text'] for comment in data['comments']]
+            if not data['next']:
+                break
+            url, params = data['next'], {}
+        self.assertEqual(texts, [f'Комментарий {i}' for i in range(6, -1, -1)])
+
+    def test_comments_fragment(self):
+        """Следующая порция приходит фрагментом HTML со ссылкой «ещё»."""
+        next_start = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        ).context['next_start']
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'start': next_start},
+        )
+        self.assertContains(response, 'Комментарий 3')
+        self.assertNotContains(response, 'Комментарий 4')
+        self.assertContains(response, 'data-more-comments')
+
+    def test_comments_of_missing_post(self):
+        """Комментарии несуществующего поста — 404, пустого — 200."""
+        for url in (
+            reverse('posts:post_comments', args=[0]),
+            reverse('posts:comment_thread', args=[0, 1]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        empty_post = Post.objects.create(author=self.post.author, text='Пусто')
+        response = self.client.get(
+            reverse('posts:post_comments', args=[empty_post.pk])
+        )
+        self.assertEqual(response.status_code, 200)
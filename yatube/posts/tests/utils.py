@@ -0,0 +1,63 @@
+import io
+import struct
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+
+def jpeg_file(name, size, color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+def icc_tag(signature, data):
+    return signature, data + b'\0' * (-len(data) % 4)
+
+
+def cmyk_profile(a_star=64):
+    """Минимальный ICC-профиль CMYK: любой цвет — Lab(L, a_star, 0).
+
+    L падает с черным каналом, поэтому профиль виден по оттенку
+    результата, а наивный convert('RGB') даёт серый.
+    """
+    def s15(value):
+        return struct.pack('>i', round(value * 65536))
+
+    clut = b''
+    for index in range(16):
+        black = index & 1
+        lightness = 0xFF00 * (1 - black)
+        clut += struct.pack(
+            '>3H', lightness, 0x8000 + a_star * 256, 0x8000
+        )
+    identity = b''.join(
+        s15(1 if row == column else 0)
+        for row in range(3) for column in range(3)
+    )
+    lut = (
+        b'mft2' + b'\0' * 4 + bytes([4, 3, 2, 0]) + identity
+        + struct.pack('>2H', 2, 2)
+        + struct.pack('>2H', 0, 0xFFFF) * 4
+        + clut
+        + struct.pack('>2H', 0, 0xFFFF) * 3
+    )
+    tags = [
+        icc_tag(b'wtpt', b'XYZ ' + b'\0' * 4 + s15(0.9642) + s15(1)
+                + s15(0.8249)),
+        icc_tag(b'A2B0', lut),
+    ]
+    offset = 128 + 4 + 12 * len(tags)
+    table = struct.pack('>I', len(tags))
+    body = b''
+    for signature, data in tags:
+        table += signature + struct.pack('>2I', offset + len(body), len(data))
+        body += data
+    size = offset + len(body)
+    header = (
+        struct.pack('>I', size) + b'\0' * 4 + struct.pack('>I', 0x02100000)
+        + b'prtrCMYKLab ' + b'\0' * 12 + b'acsp' + b'\0' * 24
+        + struct.pack('>I', 0) + s15(0.9642) + s15(1) + s15(0.8249)
+    )
+    header += b'\0' * (128 - len(header))
+    return header + table + body
@@ -0,0 +1,157 @@
+"""Ветки комментариев с материализованным путём.
+
+Путь комментария — путь родителя и сегмент самого комментария: его id
+в base36 фиксированной ширины SEGMENT_WIDTH. У комментариев верхнего
+уровня id вычитается из наибольшего значения сегмента, поэтому при
+сортировке по пути новые ветки идут первыми, а ответы внутри ветки —
+по порядку, каждый сразу после родителя. Ветка целиком — диапазон
+путей [путь корня, путь корня + PATH_END) по индексу (post, path).
+
+Глубина ограничена COMMENT_MAX_DEPTH: ответ на комментарий предельной
+глубины становится ответом на его родителя. Место в ветке вычисляется
+после сохранения по одному parent_id, поэтому ответы из формы, админки
+и кода строятся одинаково. Ответы ветки нумеруются по порядку
+добавления (thread_index), и превью ветки — её ответы с номерами до
+COMMENT_REPLIES_PREVIEW. Они отмечены in_preview, и страница веток
+читает частичный индекс только по таким комментариям.
+"""
+import re
+
+from django.conf import settings
+from django.db.models import F, Subquery, Value
+from django.db.models.functions import Coalesce, Concat
+
+from .models import Comment
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+SEGMENT_WIDTH = 7
+MAX_SEGMENT = len(DIGITS) ** SEGMENT_WIDTH - 1
+# Символ больше любой цифры сегмента: закрывает диапазон путей ветки.
+PATH_END = '~'
+PATH_RE = re.compile(rf'^[0-9a-z]{{{SEGMENT_WIDTH}}}$')
+
+
+def encode(number):
+    digits = []
+    for _ in range(SEGMENT_WIDTH):
+        number, digit = divmod(number, len(DIGITS))
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits))
+
+
+def segment(comment):
+    if comment.depth == 0:
+        return encode(MAX_SEGMENT - comment.pk)
+    return encode(comment.pk)
+
+
+def set_path(comment):
+    """Записывает место в ветке только что созданного комментария.
+
+    Глубина и путь считаются по parent_id. Ответ на комментарий
+    предельной глубины становится ответом на его родителя, ответ на
+    комментарий другого поста — новой веткой.
+    """
+    parent = None
+    if comment.parent_id is not None:
+        parent = Comment.objects.filter(
+            pk=comment.parent_id, post_id=comment.post_id
+        ).values('path', 'depth', 'parent_id').first()
+    fields = {}
+    if parent is None:
+        comment.parent_id = None
+        comment.depth = 0
+        comment.path = segment(comment)
+        comment.in_preview = True
+    else:
+        parent_path = parent['path']
+        if parent['depth'] >= settings.COMMENT_MAX_DEPTH:
+            comment.parent_id = parent['parent_id']
+            comment.depth = parent['depth']
+            parent_path = parent_path[:-SEGMENT_WIDTH]
+        else:
+            comment.depth = parent['depth'] + 1
+        comment.path = parent_path + segment(comment)
+        root = Comment.objects.filter(
+            post_id=comment.post_id, path=comment.path[:SEGMENT_WIDTH]
+        )
+        root.update(reply_serial=F('reply_serial') + 1)
+        comment.thread_index = fields['thread_index'] = root.values_list(
+            'reply_serial', flat=True
+        ).get()
+        comment.in_preview = (
+            comment.thread_index <= settings.COMMENT_REPLIES_PREVIEW
+        )
+    Comment.objects.filter(pk=comment.pk).update(
+        parent_id=comment.parent_id,
+        depth=comment.depth,
+        path=comment.path,
+        in_preview=comment.in_preview,
+        **fields,
+    )
+
+
+def thread_queryset(post_id):
+    return Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).order_by('path')
+
+
+def subtree(post_id, comment_id):
+    """Комментарий со всеми ответами одним запросом по диапазону путей."""
+    root_path = Subquery(Comment.objects.filter(
+        pk=comment_id, post_id=post_id
+    ).values('path'))
+    return thread_queryset(post_id).filter(
+        path__gte=root_path,
+        path__lt=Concat(root_path, Value(PATH_END)),
+    )
+
+
+def preview_queryset(post_id, start=''):
+    """Корни и превью ответов страницы веток с корня start."""
+    per_page = settings.COMMENTS_COUNT
+    # Корни всегда в превью. Оба запроса фильтруют по условию частичного
+    # индекса comment_preview_path_idx, поэтому ответы длинных веток за
+    # превью не читаются ни при поиске границы, ни при выборке.
+    next_roots = Comment.objects.filter(
+        post_id=post_id, in_preview=True, depth=0, path__gte=start
+    ).order_by('path').values('path')
+    return thread_queryset(post_id).filter(
+        in_preview=True,
+        path__gte=start,
+        path__lt=Coalesce(
+            Subquery(next_roots[per_page + 1:per_page + 2]),
+            Value(PATH_END),
+        ),
+    )
+
+
+def thread_page(post_id, start=''):
+    """Страница веток с корня start: корни и превью ответов.
+
+    Граница страницы — путь корня, следующего за первым корнем
+    следующей страницы; она вычисляется подзапросом, поэтому вся
+    страница — один запрос по диапазону путей. Лишний корень с его
+    превью только показывает, что следующая страница есть.
+    Возвращает (комментарии, путь корня следующей страницы или None).
+    """
+    per_page = settings.COMMENTS_COUNT
+    comments = list(preview_queryset(post_id, start))
+    roots = [comment for comment in comments if comment.depth == 0]
+    if len(roots) <= per_page:
+        return comments, None
+    next_path = roots[per_page].path
+    return [
+        comment for comment in comments if comment.path < next_path
+    ], next_path
+
+
+def group_threads(comments):
+    """Разбивает упорядоченные по пути комментарии на ветки."""
+    threads = []
+    for comment in comments:
+        if comment.depth == 0 or not threads:
+            threads.append([])
+        threads[-1].append(comment)
+    return threads
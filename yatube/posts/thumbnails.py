@@ -0,0 +1,232 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+Шаблоны не уменьшают картинки во время запроса. При сохранении поста с
+новой картинкой варианты всех ширин из VARIANT_WIDTHS во всех форматах
+из FORMATS уходят в пул процессов; большие JPEG декодируются сразу в
+уменьшенном виде (draft). После генерации список вариантов и JPEG
+ширины FEED_WIDTH записываются в строки постов с этой картинкой, поэтому
+шаблон выводит готовые srcset без обращений к хранилищу; до этого
+картинки отдаются по ссылкам уменьшения (см. posts.resize).
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+ImageFormat = namedtuple('ImageFormat', 'ext pil_format mime options')
+
+# Форматы в порядке предпочтения, JPEG — запасной для всех браузеров.
+# AVIF пишется, только если Pillow собран с его поддержкой.
+FORMATS = tuple(
+    image_format for image_format in (
+        ImageFormat('avif', 'AVIF', 'image/avif', {'quality': 60}),
+        ImageFormat('webp', 'WEBP', 'image/webp', {
+            'quality': 80, 'method': 6,
+        }),
+        ImageFormat('jpg', 'JPEG', 'image/jpeg', {
+            'quality': 85, 'optimize': True, 'progressive': True,
+        }),
+    )
+    if image_format.ext != 'avif' or features.check('avif')
+)
+FALLBACK_FORMAT = 'jpg'
+
+# Картинка в ленте обрезается по центру до пропорций 960x339. Варианты
+# шире оригинала не делаются, кроме FEED_WIDTH — она нужна всегда.
+FEED_WIDTH, FEED_HEIGHT = 960, 339
+VARIANT_WIDTHS = (480, 960, 1440)
+THUMBNAIL_DIR = 'thumbs'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS
+        )
+    return _executor
+
+
+def reset_executor():
+    """Забывает пул, например сломанный после гибели процесса."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def variant_prefix(image_name):
+    digest = hashlib.md5(image_name.encode()).hexdigest()
+    return f'{THUMBNAIL_DIR}/{digest[:2]}/{digest}'
+
+
+def variant_widths(source_width):
+    return [
+        width for width in VARIANT_WIDTHS
+        if width <= max(source_width, FEED_WIDTH)
+    ]
+
+
+def variant_size(width):
+    return width, round(width * FEED_HEIGHT / FEED_WIDTH)
+
+
+def draft_size(image_size, size):
+    """Наименьший размер декодирования, из которого ещё вырезается size."""
+    scale = max(size[0] / image_size[0], size[1] / image_size[1])
+    return (
+        math.ceil(image_size[0] * scale),
+        math.ceil(image_size[1] * scale),
+    )
+
+
+def save_atomic(image, path, image_format):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    image.save(temp_path, image_format.pil_format, **image_format.options)
+    os.replace(temp_path, path)
+
+
+def make_variants(source_path, root, prefix):
+    """Задача пула процессов: все варианты одной картинки.
+
+    Возвращает список [формат, ширина, высота, имя в хранилище].
+    """
+    with Image.open(source_path) as image:
+        sizes = [variant_size(w) for w in variant_widths(image.size[0])]
+        image.draft('RGB', draft_size(image.size, sizes[-1]))
+        image = image.convert('RGB')
+    variants = []
+    for size in sizes:
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+        for image_format in FORMATS:
+            name = f'{prefix}/{size[0]}.{image_format.ext}'
+            save_atomic(resized, os.path.join(root, name), image_format)
+            variants.append([image_format.ext, *size, name])
+    return variants
+
+
+def variant_args(image_name):
+    return (
+        default_storage.path(image_name),
+        default_storage.path(''),
+        variant_prefix(image_name),
+    )
+
+
+def generate(image_name):
+    """Варианты картинки в текущем процессе."""
+    return make_variants(*variant_args(image_name))
+
+
+def delete_variants(image_name):
+    shutil.rmtree(
+        default_storage.path(variant_prefix(image_name)), ignore_errors=True
+    )
+
+
+def _on_done(future, on_ready):
+    error = future.exception()
+    if error is not None:
+        logger.error(
+            'Не удалось сделать варианты картинки', exc_info=error
+        )
+        return
+    close_old_connections()
+    try:
+        on_ready(future.result())
+    finally:
+        close_old_connections()
+
+
+def schedule(image_name, on_ready):
+    """Ставит варианты в очередь, on_ready(варианты) — после генерации.
+
+    Без THUMBNAIL_ASYNC варианты делаются сразу; картинку, которую
+    не удалось открыть, по-прежнему заменяет заглушка.
+    """
+    if not settings.THUMBNAIL_ASYNC:
+        try:
+            variants = generate(image_name)
+        except OSError:
+            return
+        on_ready(variants)
+        return
+
+    transaction.on_commit(lambda: submit(image_name, on_ready))
+
+
+def submit(image_name, on_ready):
+    """Отправляет картинку в пул; сломанный пул пересоздаётся один раз.
+
+    Вызывается после фиксации транзакции, поэтому не поднимает ошибок:
+    если пул так и не принял задачу, картинка отдаётся по ссылкам
+    уменьшения до запуска generate_thumbnails.
+    """
+    args = variant_args(image_name)
+    for _ in range(2):
+        try:
+            # BrokenProcessPool — подкласс RuntimeError, как и ошибка
+            # пула после shutdown().
+            future = get_executor().submit(make_variants, *args)
+            break
+        except RuntimeError as error:
+            reset_executor()
+            failure = error
+    else:
+        logger.error(
+            'Пул миниатюр не принял картинку %s', image_name,
+            exc_info=failure,
+        )
+        return
+    future.add_done_callback(lambda future: _on_done(future, on_ready))
+
+
+def image_fields(variants):
+    """Значения полей поста по готовым вариантам картинки."""
+    fields = {'image_variants': json.dumps(variants)}
+    for ext, width, height, name in variants:
+        if ext == FALLBACK_FORMAT and width == FEED_WIDTH:
+            fields.update(
+                thumbnail=name, thumbnail_width=width, thumbnail_height=height
+            )
+    return fields
+
+
+def srcsets(variants, url=None):
+    """srcset по типам и запасная картинка ширины FEED_WIDTH.
+
+    variants — список [формат, ширина, высота, имя], url(имя) даёт адрес
+    варианта. Возвращает {'sources': [(MIME-тип, srcset)], 'fallback',
+    'src', 'width', 'height'}.
+    """
+    url = url or default_storage.url
+    by_format = {}
+    feed_image = {}
+    for ext, width, height, name in variants:
+        by_format.setdefault(ext, []).append(f'{url(name)} {width}w')
+        if ext == FALLBACK_FORMAT and width == FEED_WIDTH:
+            feed_image = {'src': url(name), 'width': width, 'height': height}
+    return {
+        'sources': [
+            (image_format.mime, ', '.join(by_format[image_format.ext]))
+            for image_format in FORMATS
+            if image_format.ext != FALLBACK_FORMAT
+            and image_format.ext in by_format
+        ],
+        'fallback': ', '.join(by_format.get(FALLBACK_FORMAT, [])),
+        **feed_image,
+    }
@@ -0,0 +1,173 @@
+"""Лента подписок, материализованная при записи (fan-out on write).
+
+Каждому подписчику автора при публикации поста добавляется запись
+TimelineEntry, поэтому /follow/ читает один диапазон индекса
+(user, -pub_date, -post) вместо соединения Post с Follow и сортировки.
+При включённом TIMELINE_FANOUT_ASYNC работа записывается в таблицу
+PendingFanout в той же транзакции и уходит в фоновый поток после её
+фиксации; то, что поток не успел до перезапуска, выполняет команда
+drain_timeline_queue. Движки 'merge' и 'hybrid' (см.
+FOLLOW_FEED_ENGINE) не раскладывают по лентам посты популярных авторов.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import Follow, PendingFanout, Post, TimelineEntry, UserStats
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='timeline'
+        )
+    return _executor
+
+
+def run_pending(pending):
+    """Выполняет отложенную запись и убирает её из очереди.
+
+    Все задачи идемпотентны, поэтому повтор после сбоя безопасен.
+    """
+    args = [int(arg) for arg in pending.args.split(',')]
+    TASKS[pending.task](*args)
+    PendingFanout.objects.filter(pk=pending.pk).delete()
+
+
+def _run_in_worker(pending_id):
+    close_old_connections()
+    try:
+        pending = PendingFanout.objects.filter(pk=pending_id).first()
+        if pending is not None:
+            run_pending(pending)
+    finally:
+        close_old_connections()
+
+
+def schedule(func, *args):
+    """Выполняет запись в ленты сразу или в фоновом потоке."""
+    if not settings.TIMELINE_FANOUT_ASYNC:
+        func(*args)
+        return
+    pending = PendingFanout.objects.create(
+        task=func.__name__, args=','.join(str(arg) for arg in args)
+    )
+    transaction.on_commit(
+        lambda: get_executor().submit(_run_in_worker, pending.pk)
+    )
+
+
+def fans_out(author_id):
+    """Раскладываются ли посты автора по лентам подписчиков."""
+    engine = settings.FOLLOW_FEED_ENGINE
+    if engine == 'hybrid':
+        return not UserStats.objects.filter(
+            pk=author_id,
+            follower_count__gte=settings.FOLLOW_FEED_HYBRID_THRESHOLD,
+        ).exists()
+    return engine == 'timeline'
+
+
+def bulk_insert(entries):
+    entries = iter(entries)
+    while True:
+        chunk = list(islice(entries, settings.TIMELINE_CHUNK_SIZE))
+        if not chunk:
+            return
+        TimelineEntry.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+def fan_out_post(post_id):
+    """Добавляет пост в ленты всех подписчиков автора."""
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'pub_date'
+    ).first()
+    if post is None or not fans_out(post['author_id']):
+        return
+    followers = Follow.objects.filter(
+        author_id=post['author_id']
+    ).values_list('user_id', flat=True)
+    bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=post['author_id'],
+            pub_date=post['pub_date'],
+        ) for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    if not fans_out(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )
+    bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        ) for post_id, pub_date in posts.iterator()
+    )
+
+
+def crossed_threshold(author_id, delta):
+    """Пересёк ли автор порог гибридного движка изменением на delta.
+
+    Вызывается после изменения follower_count в той же транзакции.
+    """
+    if settings.FOLLOW_FEED_ENGINE != 'hybrid':
+        return False
+    threshold = settings.FOLLOW_FEED_HYBRID_THRESHOLD
+    count = UserStats.objects.filter(pk=author_id).values_list(
+        'follower_count', flat=True
+    ).first()
+    return count == (threshold if delta > 0 else threshold - 1)
+
+
+def rebalance(author_id):
+    """Переводит ленты подписчиков автора на его текущий режим.
+
+    Лента гибридного движка читает посты автора либо из TimelineEntry,
+    либо слиянием, по текущему числу подписчиков. После пересечения
+    порога вниз в ленты подписчиков добавляются все посты автора, в том
+    числе написанные без раскладки, а вверх — записи автора удаляются:
+    их заменяет список последних постов.
+    """
+    if not fans_out(author_id):
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+        return
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    """Пересобирает ленту пользователя по его текущим подпискам."""
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        for author_id in Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True
+        ):
+            backfill(user_id, author_id)
+
+
+TASKS = {
+    func.__name__: func
+    for func in (fan_out_post, backfill, rebalance, prune, rebuild)
+}
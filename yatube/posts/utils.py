@@ -1,9 +1,212 @@
+import base64
+import binascii
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .counters import get_feed_count
+
+CURSOR_AFTER = 'after'
+CURSOR_BEFORE = 'before'
+KEYSET_FIELDS = ('pub_date', 'pk')
+
+
+def encode_cursor(obj, fields=KEYSET_FIELDS):
+    """Курсор записи: дата публикации и id в url-безопасном виде."""
+    date_field, id_field = fields
+    raw = f'{getattr(obj, date_field).isoformat()}|{getattr(obj, id_field)}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает курсор, для испорченного курсора возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def keyset_filter(fields, cursor, lookup):
+    """Условие «после курсора» (lookup='lt') или «до курсора» ('gt')."""
+    date_field, id_field = fields
+    pub_date, pk = cursor
+    return Q(**{f'{date_field}__{lookup}': pub_date}) | Q(**{
+        date_field: pub_date,
+        f'{id_field}__{lookup}': pk,
+    })
+
+
+class KeysetPage(Page):
+    """Страница курсорного пагинатора: не знает своего номера."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self.page_window = []
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if has_next and object_list:
+            self.next_cursor = encode_cursor(
+                object_list[-1], paginator.fields
+            )
+        if has_previous and object_list:
+            self.previous_cursor = encode_cursor(
+                object_list[0], paginator.fields
+            )
+
+    def __repr__(self):
+        return '<Keyset page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return None
+
+    def previous_page_number(self):
+        return None
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id) без OFFSET и COUNT(*).
+
+    Стоимость страницы не зависит от её глубины: выбирается
+    posts_count + 1 запись по индексу начиная с курсора.
+    """
+
+    def __init__(self, object_list, per_page, after=None, before=None,
+                 fields=KEYSET_FIELDS):
+        date_field, id_field = fields
+        super().__init__(
+            object_list.order_by(f'-{date_field}', f'-{id_field}'), per_page
+        )
+        self.after = after
+        self.before = before
+        self.fields = fields
+
+    def keyset_page(self):
+        queryset = self.object_list
+        limit = self.per_page + 1
+        if self.before is not None:
+            rows = list(
+                queryset.filter(
+                    keyset_filter(self.fields, self.before, 'gt')
+                ).reverse()[:limit]
+            )
+            has_previous = len(rows) == limit
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return KeysetPage(rows, self, True, has_previous)
+        if self.after is not None:
+            queryset = queryset.filter(
+                keyset_filter(self.fields, self.after, 'lt')
+            )
+        rows = list(queryset[:limit])
+        has_next = len(rows) == limit
+        return KeysetPage(
+            rows[:self.per_page], self, has_next, self.after is not None
+        )
+
+
+def page_window(page, on_each_side=None, on_ends=1):
+    """Номера страниц для навигации, None на месте пропуска.
+
+    Кроме соседних с текущей (по умолчанию PAGE_WINDOW с каждой стороны)
+    показываются on_ends первых и последних страниц, поэтому длина
+    списка не зависит от числа страниц. Пропуск из одной страницы
+    заменяется её номером.
+    """
+    if on_each_side is None:
+        on_each_side = settings.PAGE_WINDOW
+    num_pages = page.paginator.num_pages
+    numbers = sorted({
+        *range(1, min(on_ends, num_pages) + 1),
+        *range(
+            max(page.number - on_each_side, 1),
+            min(page.number + on_each_side, num_pages) + 1,
+        ),
+        *range(max(num_pages - on_ends + 1, 1), num_pages + 1),
+    })
+    window = []
+    previous = 0
+    for number in numbers:
+        if number - previous == 2:
+            window.append(previous + 1)
+        elif number - previous > 2:
+            window.append(None)
+        window.append(number)
+        previous = number
+    return window
+
+
+def set_cursors(page, fields=KEYSET_FIELDS):
+    """Добавляет странице курсоры соседних страниц и окно номеров."""
+    page.page_window = page_window(page)
+    page.next_cursor = None
+    page.previous_cursor = None
+    if page.has_next() and len(page):
+        page.next_cursor = encode_cursor(page[len(page) - 1], fields)
+    if page.has_previous() and len(page):
+        page.previous_cursor = encode_cursor(page[0], fields)
+    return page
+
+
+def get_cursor(request):
+    """Курсор из ?after= или ?before=: пара (параметр, курсор)."""
+    for param in (CURSOR_AFTER, CURSOR_BEFORE):
+        token = request.GET.get(param)
+        cursor = decode_cursor(token) if token else None
+        if cursor is not None:
+            return param, cursor
+    return None, None
+
+
+class CountedPaginator(Paginator):
+    """Пагинатор с заранее известным числом объектов."""
+
+    def __init__(self, object_list, per_page, count):
+        super().__init__(object_list, per_page)
+        self.count = count
+
 
+def get_paginator(request, queryset, posts_count=settings.POSTS_COUNT,
+                  count_key=None, keyset_fields=KEYSET_FIELDS, count=None):
+    """Пагинатор.
 
-def get_paginator(request, queryset, posts_count=settings.POSTS_COUNT):
-    """Пагинатор"""
-    paginator = Paginator(queryset, posts_count)
+    Параметры ?after=/?before= включают курсорный режим, номер
+    страницы ?page= остаётся запасным вариантом для старых ссылок.
+    С count_key размер ленты берётся из хранилища счётчиков вместо
+    COUNT(*), count — готовый размер ленты, keyset_fields задаёт поля
+    даты и id курсора.
+    """
+    param, cursor = get_cursor(request)
+    if cursor is not None:
+        return KeysetPaginator(
+            queryset, posts_count, fields=keyset_fields, **{param: cursor}
+        ).keyset_page()
+    if count is not None:
+        paginator = CountedPaginator(queryset, posts_count, count)
+    elif count_key is None:
+        paginator = Paginator(queryset, posts_count)
+    else:
+        paginator = CountedPaginator(
+            queryset, posts_count, get_feed_count(count_key, queryset)
+        )
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    return set_cursors(paginator.get_page(page_number), keyset_fields)
@@ -0,0 +1,53 @@
+"""Версии содержимого для ключей кеша страниц.
+
+Версия хранится в кеше и увеличивается сигналами при записях, которые
+меняют страницу. Ключ кеша страницы содержит текущую версию, поэтому
+страница может храниться долго и всё равно становится неактуальной
+сразу после записи.
+"""
+import time
+
+from django.core.cache import cache
+
+FEED_VERSION = 'feed'
+
+
+def group_version(group_id):
+    return f'group:{group_id}'
+
+
+def author_version(author_id):
+    return f'author:{author_id}'
+
+
+def version_key(name):
+    return f'version:{name}'
+
+
+def initial_version():
+    """Начальная версия из времени.
+
+    Если версия вытеснена из кеша, новая не совпадёт со старыми и не
+    поднимет страницы, закешированные до вытеснения.
+    """
+    return int(time.time() * 1000)
+
+
+def get_versions(names):
+    """Текущие версии по именам, отсутствующие заводятся заново."""
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*names):
+    for name in names:
+        key = version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, initial_version(), None)
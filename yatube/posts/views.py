@@ -1,61 +1,170 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core import signing
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition
 
+from core.media import serve_file
+
+from . import (counters, etags, feeds, resize, search, tags, threads,
+               versions)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Follow, Group, Post, Tag, User
+from .personal import shared_cache_page
 from .utils import get_paginator
 
 
-@cache_page(20, key_prefix='index_page')
+@condition(etag_func=etags.index_etag)
+@shared_cache_page(
+    settings.INDEX_PAGE_TIMEOUT,
+    key_prefix='index_page',
+    get_names=lambda request: [versions.FEED_VERSION],
+)
 def index(request):
-    posts = Post.objects.all().order_by('-pub_date')
-    page_obj = get_paginator(request, posts)
+    posts = feeds.index_feed()
+    page_obj = get_paginator(
+        request, posts, count_key=counters.ALL_POSTS_KEY
+    )
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=etags.group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = get_paginator(request, posts)
+    # Страница ленты нужна только при промахе кеша фрагмента.
+    page_obj = SimpleLazyObject(lambda: get_paginator(
+        request,
+        feeds.group_feed(group),
+        count_key=counters.group_key(group.pk),
+    ))
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_version': versions.get_versions(
+            [versions.group_version(group.pk)]
+        )[0],
+        'feed_timeout': settings.FEED_FRAGMENT_TIMEOUT,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+def tag_posts(request, name):
+    tag = get_object_or_404(Tag, name=tags.normalize(name))
+    context = {
+        'tag': tag,
+        'post_count': counters.get_feed_count(
+            counters.tag_key(tag.pk), tag.links.all()
+        ),
+        'page_obj': feeds.tag_page(request, tag),
+    }
+    return render(request, 'posts/tag_list.html', context)
+
+
+@condition(etag_func=etags.profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    page_obj = get_paginator(request, author.posts.all())
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    page_obj = SimpleLazyObject(lambda: get_paginator(
+        request,
+        feeds.author_feed(author),
+        count_key=counters.author_key(author.pk),
+    ))
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following,
+        'feed_version': versions.get_versions(
+            [versions.author_version(author.pk)]
+        )[0],
+        'feed_timeout': settings.FEED_FRAGMENT_TIMEOUT,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@condition(etag_func=etags.post_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related(*feeds.FEED_RELATED, 'author__stats'),
+        id=post_id,
+    )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments, next_start = threads.thread_page(post.pk)
+    reply_to = request.GET.get('reply_to', '')
     context = {
         'post': post,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'threads': threads.group_threads(comments),
+        'next_start': next_start,
+        'reply_to': reply_to if reply_to.isdigit() else None,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_response(request, post_id, comments, next_start=None,
+                      full_thread=False):
+    """Комментарии фрагментом HTML или JSON (?format=json)."""
+    if request.GET.get('format') != 'json':
+        return render(request, 'includes/comments.html', {
+            'post_id': post_id,
+            'threads': threads.group_threads(comments),
+            'next_start': next_start,
+            'full_thread': full_thread,
+        })
+    next_url = None
+    if next_start:
+        next_url = '{}?{}'.format(
+            reverse('posts:post_comments', args=[post_id]),
+            urlencode({'start': next_start, 'format': 'json'}),
+        )
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'parent': comment.parent_id,
+                'depth': comment.depth,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+                'hidden_replies': comment.hidden_replies,
+            } for comment in comments
+        ],
+        'next': next_url,
+    })
+
+
+def post_comments(request, post_id):
+    """Следующая страница веток комментариев с корня ?start=."""
+    start = request.GET.get('start', '')
+    if not threads.PATH_RE.match(start):
+        start = ''
+    comments, next_start = threads.thread_page(post_id, start)
+    # Пост проверяется, только если комментариев нет: у несуществующего
+    # поста их не бывает.
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return comments_response(request, post_id, comments, next_start)
+
+
+def comment_thread(request, post_id, comment_id):
+    """Комментарий со всеми ответами."""
+    comments = list(threads.subtree(post_id, comment_id))
+    # Ветка ищется по посту, поэтому для несуществующего поста она пуста.
+    if not comments:
+        raise Http404
+    return comments_response(request, post_id, comments, full_thread=True)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -90,6 +199,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -97,14 +207,36 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        # Чужой или несуществующий родитель делает ответ новой веткой,
+        # см. threads.set_path.
+        parent_id = request.POST.get('parent', '')
+        if parent_id.isdigit():
+            comment.parent_id = int(parent_id)
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def post_search(request):
+    """Поиск по постам или комментариям (?in=), дальше — ?after=."""
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('in')
+    if kind not in search.KINDS:
+        kind = search.POST
+    token = request.GET.get('after')
+    after = search.decode_cursor(token) if token else None
+    results, next_cursor = search.search(query, kind, after)
+    context = {
+        'query': query,
+        'kind': kind,
+        'results': results,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_paginator(request, posts)
+    page_obj = feeds.follow_page(request)
     context = {
         'page_obj': page_obj,
     }
@@ -112,6 +244,7 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -123,6 +256,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     get_object_or_404(
@@ -131,3 +265,16 @@ def profile_unfollow(request, username):
         author=author,
     ).delete()
     return redirect('posts:profile', author)
+
+
+def resized_image(request, token):
+    """Уменьшенная картинка по подписанной ссылке."""
+    try:
+        name, _ = resize.get_resized(token)
+    except (signing.BadSignature, OSError):
+        raise Http404
+    except resize.ResizeBusy:
+        response = HttpResponse(status=503)
+        response['Retry-After'] = settings.IMAGE_RESIZE_WAIT
+        return response
+    return serve_file(request, name, immutable=True)
@@ -15,10 +15,29 @@ ALLOWED_HOSTS = [
 
 POSTS_COUNT = 10
 
+# Номера страниц по сторонам от текущей в навигации.
+PAGE_WINDOW = 2
+
 POST_CHAR_COUNT = 15
 
 COMMENT_LENGTH = 200
 
+# Ветки комментариев к посту подгружаются порциями такого размера.
+COMMENTS_COUNT = 20
+
+# Ответы глубже не вкладываются (см. posts.threads).
+COMMENT_MAX_DEPTH = 4
+
+# Ответов ветки в превью на странице поста. Отметка in_preview ставится
+# при создании ответа, старые ответы её при смене значения не меняют.
+COMMENT_REPLIES_PREVIEW = 3
+
+# Теги длиннее не распознаются в тексте поста (см. posts.tags).
+TAG_MAX_LENGTH = 50
+
+# Результатов поиска на странице (см. posts.search).
+SEARCH_RESULTS_COUNT = 20
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -31,12 +50,52 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файлы MEDIA_ROOT отдаёт прокси: 'x-accel-redirect' для nginx (location
+# MEDIA_ACCEL_PREFIX с internal и alias на MEDIA_ROOT) или 'x-sendfile'.
+# None — файлы отдаёт Django (см. core.media).
+MEDIA_SENDFILE = None
+
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+MEDIA_MAX_AGE = 60 * 60
+
+# Файл с хешем в имени под этим именем не меняется.
+MEDIA_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
 CACHES = {
+    # Небольшой кеш процесса перед общим кешем всех процессов сервера,
+    # сбросы доходят до остальных процессов через журнал (см. core.cache).
     'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'L1': 'local',
+            'L2': 'shared',
+            'L1_TIMEOUT': 60,
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'local': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'LOCATION': 'local',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            # Списки последних постов авторов для движка ленты 'merge'
+            # занимают по записи на автора.
+            'MAX_ENTRIES': 100000,
+        },
+    },
 }
 
+# Тесты не должны читать и сбрасывать общий кеш сервера или
+# разработчика: их L2 лежит во временном каталоге (см. core.runner).
+TEST_RUNNER = 'core.runner.TestRunner'
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -145,3 +204,75 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+
+#  Follow timelines
+
+# Движок ленты подписок:
+# 'timeline' - материализованная при записи лента TimelineEntry;
+# 'merge' - слияние закешированных списков постов авторов при чтении;
+# 'hybrid' - авторы с числом подписчиков от FOLLOW_FEED_HYBRID_THRESHOLD
+# читаются слиянием, остальные раскладываются по TimelineEntry;
+# 'join' - прямой запрос Post JOIN Follow.
+# После смены движка ленты пересобираются командой rebuild_timelines.
+# Счётчики лент подписок поддерживаются только движком 'timeline',
+# после перехода на него их исправляет reconcile_feed_counts.
+FOLLOW_FEED_ENGINE = 'timeline'
+
+FOLLOW_FEED_HYBRID_THRESHOLD = 10000
+
+FOLLOW_FEED_RECENT_LIMIT = 200
+
+FOLLOW_FEED_RECENT_TIMEOUT = 60 * 60
+
+# Размер ленты подписок других движков — сумма постов авторов, которая
+# кешируется на это время.
+FOLLOW_FEED_COUNT_TIMEOUT = 60
+
+# Писать ленты подписок в фоновом потоке после фиксации транзакции.
+# Невыполненные до перезапуска записи выполняет drain_timeline_queue.
+TIMELINE_FANOUT_ASYNC = False
+
+TIMELINE_CHUNK_SIZE = 500
+
+
+#  Post images
+
+# Миниатюры картинок постов делаются в пуле процессов после фиксации
+# транзакции (см. posts.thumbnails).
+THUMBNAIL_ASYNC = True
+
+THUMBNAIL_WORKERS = 2
+
+# Загрузки пишутся во временный файл, а не в память.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Оригинал уменьшается до этого размера по большей стороне.
+IMAGE_UPLOAD_MAX_SIZE = 2560
+
+# Картинки с большим числом пикселей отклоняются до декодирования.
+IMAGE_UPLOAD_MAX_PIXELS = 50_000_000
+
+# Уменьшение картинок по подписанным ссылкам (см. posts.resize): не
+# больше IMAGE_RESIZE_WORKERS одновременно в процессе, ожидание места
+# или чужого результата — до IMAGE_RESIZE_WAIT секунд.
+IMAGE_RESIZE_WORKERS = 2
+
+IMAGE_RESIZE_WAIT = 10
+
+
+#  Page caching
+
+# Страницы кешируются надолго: ключ содержит версию содержимого,
+# которую сигналы увеличивают при записи (см. posts.versions).
+INDEX_PAGE_TIMEOUT = 60 * 60 * 6
+
+# Лента группы и профиля кешируется фрагментом шаблона по версии
+# группы или автора: кнопка подписки остаётся вне общего фрагмента.
+FEED_FRAGMENT_TIMEOUT = 60 * 60 * 6
+
+# Время жизни отрисованной карточки поста: устаревшие карточки
+# вытесняются сменой card_version, а не истечением срока.
+POST_CARD_TIMEOUT = 60 * 60 * 24